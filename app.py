@@ -1,10 +1,32 @@
 from flask import Flask, render_template, request, send_file, jsonify
 import os
-from docx_generator import create_practice_document, create_answer_key_document, parse_question, clean_special_characters, format_cleaned_question, create_snowpro_core_with_answers
-import pandas as pd
+import functools
+import gzip
+import hashlib
+import logging
+import random
+import time
+from io import BytesIO
+from urllib.parse import urlencode, urlparse
+from docx_generator import PRACTICE, ANSWER_KEY, SNOWPRO, CLEANED_TEXT
+from question_bank import bank_cache
+from question_parser import clean_texts
+from jobs import JobManager, run_scrape_task
+from incremental import Manifest, InputWatcher, MERGED_ENTRY, file_source, merged_source
+from doc_cache import DocumentCache
+from parallel_render import DEFAULT_CHUNK_SIZE, part_path
+from artifacts import ArtifactStore
+from search_index import SearchIndex
+from bank_merge import bank_merger, DEFAULT_NEAR_THRESHOLD
+from attempt_store import AttemptStore, parse_attempt, grade_attempt, DEFAULT_MOST_MISSED, MAX_BATCH
+from bank_upload import ingest_stream, UploadError, DEFAULT_MAX_UPLOAD_BYTES
+from werkzeug.utils import secure_filename
+from build_executor import BuildExecutor, Overloaded
+import metrics
 from datetime import datetime
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
 
 # Configure folders
 INPUT_FOLDER = 'inputs'
@@ -16,6 +38,77 @@ os.makedirs(INPUT_FOLDER, exist_ok=True)
 os.makedirs(OUT_RAWTXT, exist_ok=True)
 os.makedirs(OUT_DOCS, exist_ok=True)
 
+# Compiled question-bank indexes, rebuilt whenever their source changes
+INDEX_FOLDER = os.path.join(OUT_RAWTXT, 'index')
+bank_cache.index_folder = INDEX_FOLDER
+
+# Fetched pages kept between /scrape runs for conditional GETs and resuming
+SCRAPE_CACHE_FOLDER = os.path.join(OUT_RAWTXT, 'scrape_cache')
+
+# What /process_files last wrote from each input, so unchanged inputs
+# are skipped and changed ones re-parse only their changed questions
+MANIFEST_FOLDER = os.path.join(OUT_RAWTXT, 'manifest')
+
+# WATCH_INPUTS=1 reprocesses the inputs whenever .txt files there change
+WATCH_INPUTS = os.environ.get('WATCH_INPUTS', '0') == '1'
+WATCH_INTERVAL = float(os.environ.get('WATCH_INTERVAL', '2.0'))
+
+# Worker processes used by /clean and /process_files jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1))
+job_manager = JobManager(max_workers=JOB_WORKERS)
+
+# Document and spreadsheet builds run on BUILD_WORKERS processes (0 runs
+# them in the request thread); past BUILD_QUEUE waiting builds, requests
+# get 503 instead of piling up behind them
+BUILD_WORKERS = int(os.environ.get('BUILD_WORKERS', os.cpu_count() or 1))
+BUILD_QUEUE = int(os.environ['BUILD_QUEUE']) if os.environ.get('BUILD_QUEUE') else None
+build_executor = BuildExecutor(max_workers=BUILD_WORKERS, max_queue=BUILD_QUEUE)
+
+# Generated documents, keyed by input content hash, type and generator version.
+# Set WRITE_DOCS_TO_DISK=0 to keep them in memory only.
+WRITE_DOCS_TO_DISK = os.environ.get('WRITE_DOCS_TO_DISK', '1') != '0'
+DOC_CACHE_FOLDER = os.path.join(OUT_DOCS, 'cache') if WRITE_DOCS_TO_DISK else None
+DOC_CACHE_MAX_BYTES = 512 * 1024 * 1024
+DOC_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+# Large banks are rendered in chunks on the build workers, or on this many
+# worker processes when BUILD_WORKERS=0
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', os.cpu_count() or 1))
+doc_cache = DocumentCache(
+    DOC_CACHE_FOLDER, max_bytes=DOC_CACHE_MAX_BYTES, max_age=DOC_CACHE_MAX_AGE, render_workers=RENDER_WORKERS,
+    executor=build_executor
+)
+
+# Quiz and document routes serve every bank merged, with exact and
+# near-duplicate questions dropped; MERGE_NEAR_THRESHOLD=0 keeps rewordings
+MERGE_NEAR_THRESHOLD = float(os.environ.get('MERGE_NEAR_THRESHOLD', DEFAULT_NEAR_THRESHOLD))
+bank_merger.near_threshold = MERGE_NEAR_THRESHOLD
+# Merge features and results are kept next to the compiled indexes
+bank_merger.folder = INDEX_FOLDER
+
+# Full-text index over all banks, refreshed per bank on change
+search_index = SearchIndex()
+
+# Per-request handles for generated documents awaiting download; documents
+# on disk get signed handles that every worker process can resolve
+ARTIFACT_KEY = os.environ.get('ARTIFACT_KEY', '').encode('utf-8') or None
+artifact_store = ArtifactStore(folder=DOC_CACHE_FOLDER, key=ARTIFACT_KEY)
+
+# Append-only log of submitted quiz answers and their running aggregates
+ATTEMPTS_DB = os.path.join(OUT_RAWTXT, 'attempts.sqlite')
+attempt_store = AttemptStore(ATTEMPTS_DB)
+
+# Largest bank accepted by /upload_bank, in bytes
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', DEFAULT_MAX_UPLOAD_BYTES))
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    response = jsonify({'status': 'error', 'message': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -23,10 +116,17 @@ def index():
 @app.route('/scrape', methods=['POST'])
 def scrape():
     url = request.form.get('url')
+    if not url or urlparse(url).scheme not in ('http', 'https'):
+        return jsonify({'status': 'error', 'message': 'Please enter a valid http(s) URL'}), 400
     try:
+        # The crawl is rate limited per host, so it runs as a background job
         output_file = os.path.join(OUT_RAWTXT, 'scraped_content.txt')
-        # scraping logic will be implemented later
-        return jsonify({'status': 'success', 'message': 'Scraping feature coming soon!'})
+        job_id = job_manager.submit_call('scrape', url, run_scrape_task, url, output_file, SCRAPE_CACHE_FOLDER)
+        return jsonify({
+            'status': 'success',
+            'message': f'Scraping {url} into {output_file} in the background',
+            'job_id': job_id
+        }), 202
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
@@ -39,6 +139,7 @@ def clean():
         if not input_files:
             return jsonify({'status': 'error', 'message': 'No text files found in inputs folder'})
         
+        tasks = []
         for input_file in input_files:
             file_base_name = os.path.splitext(input_file)[0]
             input_path = os.path.join(INPUT_FOLDER, input_file)
@@ -47,101 +148,182 @@ def clean():
             practice_doc = os.path.join(OUT_DOCS, f'{file_base_name}_practice.docx')
             answer_key_doc = os.path.join(OUT_DOCS, f'{file_base_name}_with_answers.docx')
 
-            # Generate documents
-            create_practice_document(input_path, practice_doc)
-            create_answer_key_document(input_path, answer_key_doc)
+            # Both documents are rendered from a single pass over the questions
+            tasks.append((input_path, [
+                (PRACTICE, practice_doc),
+                (ANSWER_KEY, answer_key_doc),
+            ]))
         
-        return jsonify({'status': 'success', 'message': 'Files processed successfully'})
+        job_id = job_manager.submit('clean', tasks)
+        return jsonify({
+            'status': 'success',
+            'message': f'Processing {len(tasks)} files in the background',
+            'job_id': job_id
+        }), 202
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
 
+# Document types served by /generate_doc
+DOCUMENT_TYPES = {
+    'practice': (PRACTICE, 'practice_questions.docx'),
+    'answers': (ANSWER_KEY, 'questions_with_answers.docx'),
+}
+
+def _document_response(item):
+    """Send a document held either in memory or on disk"""
+    source = BytesIO(item['data']) if item['data'] is not None else item['path']
+    return send_file(
+        source,
+        as_attachment=True,
+        download_name=item['filename'],
+        mimetype=item['mimetype']
+    )
+
+def _merged_bank():
+    """Merge every bank in the inputs folder, or None if there are none"""
+    input_files = sorted(f for f in os.listdir(INPUT_FOLDER) if f.endswith('.txt'))
+    if not input_files:
+        return None
+    return bank_merger.merge([os.path.join(INPUT_FOLDER, f) for f in input_files])
+
+def _get_document(input_file, kind, filename):
+    """Fetch a document from the cache as an artifact entry"""
+    if doc_cache.folder:
+        return {'filename': filename, 'mimetype': DOCX_MIMETYPE, 'data': None, 'path': doc_cache.get(input_file, kind)}
+    return {'filename': filename, 'mimetype': DOCX_MIMETYPE, 'data': doc_cache.get_bytes(input_file, kind), 'path': None}
+
+@app.route('/upload_bank', methods=['POST'])
+def upload_bank():
+    """Add a raw question dump to the inputs folder from the request body.
+
+    The body is read as a stream (chunked transfer encoding works) and
+    parsed while it arrives. Query parameters: name (the bank's file name)
+    and replace=1 to overwrite an existing bank.
+    """
+    name = secure_filename(request.args.get('name', ''))
+    if not name:
+        return jsonify({'status': 'error', 'message': 'Please give the bank a name'}), 400
+    if not name.endswith('.txt'):
+        name = f'{name}.txt'
+    target = os.path.join(INPUT_FOLDER, name)
+    replace = request.args.get('replace') == '1'
+    if os.path.exists(target) and not replace:
+        return jsonify({'status': 'error', 'message': f'{name} already exists; pass replace=1 to overwrite it'}), 409
+    
+    try:
+        summary = ingest_stream(request.stream, target, max_bytes=MAX_UPLOAD_BYTES, replace=replace)
+        # Merge now so the first quiz load after the upload is served from cache
+        _quiz_questions(_merged_bank())
+        return jsonify(dict(summary, status='success', bank=name)), 201
+        
+    except UploadError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Error uploading {name}: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/generate_doc', methods=['POST'])
 def generate_doc():
     try:
         doc_type = request.json.get('type')
+        # Send the document in this response instead of returning a handle
+        download = bool(request.json.get('download'))
+        # Render one part document per part_size questions, each with a handle
+        split = bool(request.json.get('split'))
+        part_size = request.json.get('part_size', DEFAULT_CHUNK_SIZE)
+        if split and (download or not doc_cache.folder):
+            return jsonify({
+                'status': 'error',
+                'message': 'Split documents are kept on disk and returned as handles; drop download'
+                if download else 'Split documents need WRITE_DOCS_TO_DISK'
+            }), 400
+        if split and (not isinstance(part_size, int) or part_size < 1):
+            return jsonify({
+                'status': 'error',
+                'message': 'part_size must be a positive integer'
+            }), 400
         
-        # Get all text files from inputs folder
-        input_files = [f for f in os.listdir(INPUT_FOLDER) if f.endswith('.txt')]
+        # Merge all text files from inputs folder
+        merged = _merged_bank()
         
-        if not input_files:
+        if merged is None:
             return jsonify({
                 'status': 'error',
                 'message': 'No .txt files found in inputs folder'
             }), 404
         
-        # Use the first file found
-        input_file = os.path.join(INPUT_FOLDER, input_files[0])
-        print(f"Using input file: {input_file}")  # Debug log
+        logger.debug(f"Using input files: {merged.sources}")
         
-        # Generate timestamp for unique filenames
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if doc_type not in DOCUMENT_TYPES:
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid document type requested'
+            }), 400
+        kind, filename = DOCUMENT_TYPES[doc_type]
         
         try:
-            if doc_type == 'practice':
-                output_file = os.path.join(OUT_DOCS, f'practice_questions_{timestamp}.docx')
-                create_practice_document(input_file, output_file)
-                app.config['LATEST_PRACTICE_DOC'] = output_file
-                print(f"Practice document generated: {output_file}")  # Debug log
-                
-            elif doc_type == 'answers':
-                output_file = os.path.join(OUT_DOCS, f'questions_with_answers_{timestamp}.docx')
-                create_answer_key_document(input_file, output_file)
-                app.config['LATEST_ANSWERS_DOC'] = output_file
-                print(f"Answer key document generated: {output_file}")  # Debug log
-                
+            if split:
+                parts = doc_cache.get_parts(merged, kind, part_size)
             else:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Invalid document type requested'
-                }), 400
+                item = _get_document(merged, kind, filename)
+            logger.debug(f"Document ready: {doc_type}")
                 
+        except Overloaded:
+            raise
         except Exception as doc_error:
-            print(f"Error generating document: {str(doc_error)}")  # Debug log
+            logger.error(f"Error generating document: {str(doc_error)}")
             return jsonify({
                 'status': 'error',
                 'message': f'Error generating document: {str(doc_error)}'
             }), 500
-            
+        
+        if split:
+            handles = [
+                (part_path(filename, index), artifact_store.put(part_path(filename, index), DOCX_MIMETYPE, path=path))
+                for index, path in enumerate(parts, start=1)
+            ]
+            return jsonify({
+                'status': 'success',
+                'message': f'{len(handles)} part documents generated successfully',
+                'parts': [
+                    {'filename': name, 'handle': handle, 'download_url': f'/download_doc/{handle}'}
+                    for name, handle in handles
+                ]
+            })
+        
+        if download:
+            return _document_response(item)
+        
+        # Keep the document under a per-request handle for a later download
+        handle = artifact_store.put(filename, DOCX_MIMETYPE, data=item['data'], path=item['path'])
         return jsonify({
             'status': 'success',
             'message': 'Document generated successfully',
-            'file': output_file
+            'handle': handle,
+            'download_url': f'/download_doc/{handle}'
         })
         
+    except Overloaded:
+        raise
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")  # Debug log
+        logger.error(f"Unexpected error: {str(e)}")
         return jsonify({
             'status': 'error',
             'message': f'Unexpected error: {str(e)}'
         }), 500
 
-@app.route('/download_doc/<doc_type>')
-def download_doc(doc_type):
+@app.route('/download_doc/<handle>')
+def download_doc(handle):
     try:
-        if doc_type == 'practice':
-            filepath = app.config.get('LATEST_PRACTICE_DOC')
-            filename = 'practice_questions.docx'
-        elif doc_type == 'answers':
-            filepath = app.config.get('LATEST_ANSWERS_DOC')
-            filename = 'questions_with_answers.docx'
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': 'Invalid document type'
-            }), 400
-            
-        if not filepath or not os.path.exists(filepath):
+        item = artifact_store.get(handle)
+        
+        if item is None or (item['data'] is None and not os.path.exists(item['path'])):
             return jsonify({
                 'status': 'error',
-                'message': 'Document not found. Please generate it first.'
+                'message': 'Document not found or expired. Please generate it again.'
             }), 404
             
-        return send_file(
-            filepath,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        return _document_response(item)
         
     except Exception as e:
         return jsonify({
@@ -149,148 +331,405 @@ def download_doc(doc_type):
             'message': str(e)
         }), 500
 
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = 1024
+
+@functools.lru_cache(maxsize=8)
+def _quiz_questions(merged):
+    """Select and clean the quiz questions of the merged banks; cached per merge fingerprint
+
+    Returns a dict of question id (the merge content hash) to record, in
+    bank order. Records are shared with the bank cache unless cleaning
+    changed their options; the JSON form is only built for the questions a
+    request returns.
+    """
+    questions = {}
+    clean_seconds = 0.0
+    
+    for question_id, question_data in zip(merged.ids, merged.questions):
+        # Only add questions that have valid data
+        if not question_data.correct or not question_data.options:
+            continue
+        
+        start = time.perf_counter()
+        options = tuple(clean_texts(question_data.options))
+        clean_seconds += time.perf_counter() - start
+        if options != question_data.options:
+            question_data = question_data.replace(options=options)
+        questions[question_id] = question_data
+    
+    metrics.observe_stage('clean', clean_seconds)
+    return questions
+
+def _quiz_json(question_id, question_data):
+    """Format a question for the quiz"""
+    correct = question_data.correct_indices  # List of correct indices
+    return {
+        'id': question_id,
+        'number': question_data.number,
+        'topic': question_data.topic,
+        'content': question_data.content,
+        'options': question_data.options,
+        'correctAnswers': correct,
+        'isMultiAnswer': len(correct) > 1  # Flag for multi-answer questions
+    }
+
+def _int_arg(name, minimum=0):
+    """Read an optional non-negative integer query parameter"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    value = int(value)
+    if value < minimum:
+        raise ValueError(f'{name} must be at least {minimum}')
+    return value
+
+def _select_questions(questions):
+    """Apply the topic, number range, sampling and paging query parameters
+
+    questions maps question ids to records; (id, record) pairs are returned.
+    """
+    topics = {t for value in request.args.getlist('topic') for t in value.split(',') if t}
+    number_from = _int_arg('number_from')
+    number_to = _int_arg('number_to')
+    sample = _int_arg('sample', minimum=1)
+    seed = request.args.get('seed')
+    offset = _int_arg('offset') or 0
+    limit = _int_arg('limit', minimum=1)
+    
+    selected = [
+        (question_id, q) for question_id, q in questions.items()
+        if (not topics or q.topic in topics)
+        and (number_from is None or int(q.number) >= number_from)
+        and (number_to is None or int(q.number) <= number_to)
+    ]
+    
+    if sample is not None and sample < len(selected):
+        selected = random.Random(seed).sample(selected, sample)
+    
+    total = len(selected)
+    end = total if limit is None else offset + limit
+    return selected[offset:end], total, offset, end
+
 @app.route('/get_questions')
 def get_questions():
+    """Quiz questions, optionally filtered, sampled and paginated.
+
+    Query parameters: topic (repeatable or comma separated), number_from,
+    number_to, sample (with an optional seed), offset and limit. The body
+    is always a JSON array; the filtered total is in X-Total-Count and the
+    next page, if any, in a Link header.
+    """
     try:
-        # Get the most recent file from inputs folder
-        input_files = [f for f in os.listdir(INPUT_FOLDER) if f.endswith('.txt')]
+        # Merge all text files from inputs folder
+        merged = _merged_bank()
         
-        if not input_files:
+        if merged is None:
             return jsonify({'error': 'No .txt files found in inputs folder'}), 404
-            
-        # Use the first file found
-        input_file = os.path.join(INPUT_FOLDER, input_files[0])
-        
-        with open(input_file, 'r', encoding='utf-8', errors='replace') as file:
-            content = file.read()
+        fingerprint = merged.fingerprint
         
-        # Split into questions
-        questions = []
-        raw_questions = content.split('###################################################################')
+        # Unseeded samples differ on every call, so only they skip the ETag
+        cacheable = 'sample' not in request.args or 'seed' in request.args
+        gzip_ok = 'gzip' in request.headers.get('Accept-Encoding', '')
+        etag = None
+        if cacheable:
+            query = urlencode(sorted(request.args.items(multi=True)))
+            etag = hashlib.sha256(f'{fingerprint}?{query}'.encode()).hexdigest()[:32]
+            if request.if_none_match.contains(etag) or request.if_none_match.contains(f'{etag}-gzip'):
+                response = app.response_class(status=304)
+                response.set_etag(f'{etag}-gzip' if gzip_ok else etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                response.vary.add('Accept-Encoding')
+                return response
         
-        for raw_question in raw_questions:
-            if not raw_question.strip():
-                continue
-                
-            question_data = parse_question(raw_question)
-            if not question_data:
-                continue
-                
-            # Format question for quiz
-            quiz_question = {
-                'number': question_data['number'],
-                'content': question_data['content'],
-                'options': [clean_special_characters(opt) for opt in question_data['options']],
-                'correctAnswers': [ord(ans) - ord('A') for ans in question_data['correct']],  # List of correct indices
-                'isMultiAnswer': len(question_data['correct']) > 1  # Flag for multi-answer questions
-            }
-            
-            # Only add questions that have valid data
-            if quiz_question['correctAnswers'] and quiz_question['options']:
-                questions.append(quiz_question)
+        try:
+            questions, total, offset, end = _select_questions(_quiz_questions(merged))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid query parameter: {str(e)}'}), 400
         
-        if not questions:
+        if not total:
             return jsonify({'error': 'No valid questions found in the input file'}), 404
-            
-        return jsonify(questions)
+        
+        response = jsonify([_quiz_json(question_id, question_data) for question_id, question_data in questions])
+        response.headers['X-Total-Count'] = str(total)
+        if end < total:
+            args = request.args.to_dict(flat=False)
+            args['offset'] = [str(end)]
+            response.headers['Link'] = f'<{request.path}?{urlencode(args, doseq=True)}>; rel="next"'
+        
+        response.vary.add('Accept-Encoding')
+        if gzip_ok and response.content_length and response.content_length >= COMPRESS_MIN_BYTES:
+            response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+            response.headers['Content-Encoding'] = 'gzip'
+            if etag:
+                etag = f'{etag}-gzip'
+        
+        if etag:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+        else:
+            response.headers['Cache-Control'] = 'no-store'
+        return response
         
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        print(f"Error loading questions: {str(e)}\n{error_details}")
+        logger.error(f"Error loading questions: {str(e)}\n{error_details}")
         return jsonify({'error': f'Error loading questions: {str(e)}'}), 500
 
+@app.route('/search')
+def search():
+    """Ranked full-text search over every bank in the inputs folder.
+
+    Query parameters: q (words and "quoted phrases", all required), topic
+    (repeatable or comma separated), offset and limit.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query'}), 400
+    
+    try:
+        topics = {t for value in request.args.getlist('topic') for t in value.split(',') if t}
+        offset = _int_arg('offset') or 0
+        limit = _int_arg('limit', minimum=1) or 20
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {str(e)}'}), 400
+    
+    try:
+        input_files = sorted(f for f in os.listdir(INPUT_FOLDER) if f.endswith('.txt'))
+        search_index.refresh([os.path.join(INPUT_FOLDER, f) for f in input_files])
+        total, results = search_index.search(query, topics=topics, limit=limit, offset=offset)
+        
+        return jsonify({
+            'query': query,
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'results': [
+                {
+                    'bank': os.path.basename(result['bank']),
+                    'score': result['score'],
+                    'number': result['question']['number'],
+                    'topic': result['question']['topic'],
+                    'content': result['question']['content'],
+                    'options': result['question']['options']
+                }
+                for result in results
+            ]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Error searching questions: {str(e)}'}), 500
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify(bank_cache.stats())
+
+@app.route('/merge_report')
+def merge_report():
+    """Per-bank counts and the list of questions dropped as duplicates"""
+    try:
+        merged = _merged_bank()
+        if merged is None:
+            return jsonify({'error': 'No .txt files found in inputs folder'}), 404
+        return jsonify({
+            'sources': [os.path.basename(path) for path in merged.sources],
+            'stats': merged.stats,
+            'duplicates': merged.duplicates
+        })
+    except Exception as e:
+        return jsonify({'error': f'Error merging question banks: {str(e)}'}), 500
+
+def _export_response(rows, export_format, name, sheet_name):
+    """Send rows as an xlsx (built in memory), csv or jsonl attachment"""
+    # openpyxl is only loaded when exporting
+    from results_export import write_xlsx, iter_csv, iter_jsonl, XLSX_MIMETYPE, CSV_MIMETYPE, JSONL_MIMETYPE
+    
+    # Generate filename with timestamp
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'{name}_{timestamp}.{export_format}'
+    
+    if export_format == 'xlsx':
+        return send_file(
+            BytesIO(build_executor.run(write_xlsx, rows, sheet_name=sheet_name)),
+            as_attachment=True,
+            download_name=filename,
+            mimetype=XLSX_MIMETYPE
+        )
+    
+    if export_format in ('csv', 'jsonl'):
+        body = iter_csv(rows) if export_format == 'csv' else iter_jsonl(rows)
+        mimetype = CSV_MIMETYPE if export_format == 'csv' else JSONL_MIMETYPE
+        return app.response_class(
+            body,
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    
+    return jsonify({'error': f'Unsupported export format: {export_format}'}), 400
+
 @app.route('/export_results', methods=['POST'])
 def export_results():
+    """Export quiz results as xlsx (default), csv or jsonl, built in memory"""
     try:
         data = request.json
         results = data.get('results', [])
+        export_format = data.get('format', 'xlsx')
         
         if not results:
             return jsonify({'error': 'No results to export'}), 400
-            
-        # Create DataFrame
-        df = pd.DataFrame(results)
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'wrong_answers_{timestamp}.xlsx'
-        filepath = os.path.join(OUT_DOCS, filename)
-        
-        # Create Excel writer
-        with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-            # Write results
-            df.to_excel(writer, sheet_name='Wrong Answers', index=False)
-            
-            # Auto-adjust columns width
-            worksheet = writer.sheets['Wrong Answers']
-            for idx, col in enumerate(df.columns):
-                max_length = max(
-                    df[col].astype(str).apply(len).max(),
-                    len(col)
-                ) + 2
-                worksheet.column_dimensions[chr(65 + idx)].width = max_length
+        if not all(isinstance(row, dict) for row in results):
+            return jsonify({'error': 'Each result must be an object'}), 400
         
-        return send_file(
-            filepath,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        return _export_response(results, export_format, 'wrong_answers', 'Wrong Answers')
         
+    except Overloaded:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/attempts', methods=['POST'])
+def submit_attempts():
+    """Record a batch of answered questions.
+
+    Body: {"session": optional id, "attempts": [{"id": question id from
+    /get_questions, "selected": [option indices], "seconds"}]}. Each
+    attempt is graded against the question's correct answers here.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('attempts'), list):
+            return jsonify({'error': 'Expected an object with an attempts list'}), 400
+        if len(data['attempts']) > MAX_BATCH:
+            return jsonify({'error': f'At most {MAX_BATCH} attempts per request'}), 413
+        session = data.get('session')
+        if session is not None and not isinstance(session, str):
+            return jsonify({'error': 'session must be a string'}), 400
+        
+        try:
+            attempts = [parse_attempt(attempt) for attempt in data['attempts']]
+        except ValueError as e:
+            return jsonify({'error': f'Invalid attempt: {str(e)}'}), 400
+        
+        merged = _merged_bank()
+        if merged is None:
+            return jsonify({'error': 'No .txt files found in inputs folder'}), 404
+        questions = _quiz_questions(merged)
+        unknown = [question_id for question_id, _, _ in attempts if question_id not in questions]
+        if unknown:
+            return jsonify({'error': f'Unknown question id: {unknown[0]}'}), 400
+        attempts = [
+            grade_attempt(question_id, questions[question_id], mask, seconds)
+            for question_id, mask, seconds in attempts
+        ]
+        
+        return jsonify({'recorded': attempt_store.record(attempts, session=session)}), 201
+        
+    except Exception as e:
+        logger.error(f"Error recording attempts: {str(e)}")
+        return jsonify({'error': f'Error recording attempts: {str(e)}'}), 500
+
+@app.route('/attempt_stats')
+def attempt_stats():
+    """Totals, per-topic accuracy and the most missed questions.
+
+    Query parameters: limit (most missed questions listed), or id for a
+    single question's aggregates.
+    """
+    try:
+        try:
+            limit = _int_arg('limit', minimum=1) or DEFAULT_MOST_MISSED
+        except ValueError as e:
+            return jsonify({'error': f'Invalid query parameter: {str(e)}'}), 400
+        
+        question_id = request.args.get('id')
+        if question_id is not None:
+            question = attempt_store.question(question_id)
+            if question is None:
+                return jsonify({'error': 'No attempts recorded for this question'}), 404
+            return jsonify(question)
+        
+        return jsonify({
+            'totals': attempt_store.totals(),
+            'topics': attempt_store.topics(),
+            'most_missed': attempt_store.most_missed(limit)
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Error reading attempt stats: {str(e)}'}), 500
+
+@app.route('/export_stats')
+def export_stats():
+    """Per-question error rates as xlsx (default), csv or jsonl"""
+    try:
+        rows = [
+            {
+                'Topic': question['topic'],
+                'Question Number': question['number'],
+                'Attempts': question['attempts'],
+                'Wrong': question['wrong'],
+                'Error Rate': question['error_rate'],
+                'Average Seconds': question['average_seconds'],
+                'Question Id': question['id'],
+            }
+            for question in attempt_store.questions()
+        ]
+        if not rows:
+            return jsonify({'error': 'No attempts recorded'}), 404
+        return _export_response(rows, request.args.get('format', 'xlsx'), 'question_stats', 'Question Stats')
+        
+    except Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _process_inputs():
+    """Queue cleaned text for changed inputs and the answers document for
+    the merged banks. Returns (job id, skipped names), or None without inputs.
+    """
+    input_files = sorted(f for f in os.listdir(INPUT_FOLDER) if f.endswith('.txt'))
+    if not input_files:
+        return None
+    
+    manifest = Manifest(MANIFEST_FOLDER)
+    tasks = []
+    skipped = []
+    for input_file in input_files:
+        input_path = os.path.join(INPUT_FOLDER, input_file)
+        outputs = [(CLEANED_TEXT, os.path.join(OUT_RAWTXT, f'processed_{input_file}'))]
+        if manifest.is_current(input_file, file_source(input_path), outputs):
+            skipped.append(input_file)
+        else:
+            tasks.append((input_path, outputs))
+    
+    # The Snowpro Core document with answers covers every bank, merged
+    merged = _merged_bank()
+    outputs = [(SNOWPRO, os.path.join(OUT_DOCS, 'snowpro-core_with_answers.docx'))]
+    if manifest.is_current(MERGED_ENTRY, merged_source(merged), outputs):
+        skipped.append(os.path.basename(outputs[0][1]))
+    else:
+        tasks.append((merged, outputs))
+    
+    return job_manager.submit('process_files', tasks, manifest_folder=MANIFEST_FOLDER), skipped
+
 @app.route('/process_files', methods=['POST'])
 def process_files():
     try:
-        # Get all files from input folder
-        input_files = [f for f in os.listdir(INPUT_FOLDER) if f.endswith('.txt')]
+        result = _process_inputs()
         
-        if not input_files:
+        if result is None:
             return jsonify({
                 'status': 'error',
                 'message': 'No .txt files found in inputs folder'
             }), 404
-            
-        processed_count = 0
-        for input_file in input_files:
-            input_path = os.path.join(INPUT_FOLDER, input_file)
-            output_path = os.path.join(OUT_RAWTXT, f'processed_{input_file}')
-            
-            with open(input_path, 'r', encoding='utf-8', errors='replace') as file:
-                content = file.read()
-                
-            # Split into questions
-            questions = content.split('###################################################################')
-            
-            processed_content = []
-            for question_text in questions:
-                if not question_text.strip():
-                    continue
-                    
-                # Parse and clean the question
-                question_data = parse_question(question_text)
-                if not question_data:
-                    continue
-                    
-                # Format the cleaned question
-                cleaned_question = format_cleaned_question(question_data)
-                processed_content.append(cleaned_question)
-            
-            # Write processed content
-            with open(output_path, 'w', encoding='utf-8') as file:
-                file.write('\n###################################################################\n'.join(processed_content))
-                
-            processed_count += 1
-            
-        # Generate the Snowpro Core document with answers
-        create_snowpro_core_with_answers(input_path, os.path.join(OUT_DOCS, 'snowpro-core_with_answers.docx'))
         
+        job_id, skipped = result
         return jsonify({
             'status': 'success',
-            'message': f'Successfully processed {processed_count} files and generated answers document.'
-        })
+            'message': f'Processing changed files in the background, {len(skipped)} up to date',
+            'job_id': job_id,
+            'skipped': skipped
+        }), 202
         
     except Exception as e:
         return jsonify({
@@ -298,20 +737,118 @@ def process_files():
             'message': str(e)
         }), 500
 
+@app.route('/jobs')
+def list_jobs():
+    return jsonify(job_manager.list())
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Unknown job id'
+        }), 404
+    return jsonify(job)
+
 @app.route('/generate_questions_with_answers', methods=['POST'])
 def generate_questions_with_answers():
-    # Check if the snowpro-core_with_answers.docx already exists
-    existing_file = os.path.join(OUT_DOCS, 'snowpro-core_with_answers.docx')
+    merged = _merged_bank()
+    
+    if merged is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'No .txt files found in inputs folder'
+        }), 404
     
-    if os.path.exists(existing_file):
-        return send_file(existing_file, as_attachment=True)
+    # Served from the document cache, which rebuilds it whenever an input changes
+    return _document_response(_get_document(merged, SNOWPRO, 'snowpro-core_with_answers.docx'))
+
+# Per-request profiling: PROFILE_ENDPOINTS is a comma separated list of
+# endpoint names (or 'all'); requests slower than PROFILE_MIN_SECONDS are
+# saved as .prof files for snakeviz / pstats
+PROFILE_ENDPOINTS = {e.strip() for e in os.environ.get('PROFILE_ENDPOINTS', '').split(',') if e.strip()}
+PROFILE_MIN_SECONDS = float(os.environ.get('PROFILE_MIN_SECONDS', '1.0'))
+PROFILE_FOLDER = os.path.join(OUT_RAWTXT, 'profiles')
+
+def _cache_gauges():
+    bank_stats = bank_cache.stats()
+    yield 'et_bank_cache_banks', 'Question banks held in memory', {}, bank_stats['banks']
+    for event in ('hits', 'misses', 'evictions'):
+        yield 'et_bank_cache_events', 'Question bank cache lookups by outcome', {'event': event}, bank_stats[event]
+    yield 'et_jobs', 'Background jobs known to the job manager', {}, len(job_manager.list())
+    build_stats = build_executor.stats()
+    for state in ('running', 'queued'):
+        yield 'et_builds', 'Document and spreadsheet builds by state', {'state': state}, build_stats[state]
+
+metrics.registry.register_gauges(_cache_gauges)
+
+@app.before_request
+def _start_request_metrics():
+    request.environ['et.route_token'] = metrics.current_route.set(request.endpoint or 'unknown')
+    request.environ['et.start'] = time.perf_counter()
     
-    # If it doesn't exist, generate it
-    # Call the function that generates the document
-    input_file = os.path.join(INPUT_FOLDER, 'your_input_file.txt')  # Adjust as necessary
-    create_snowpro_core_with_answers(input_file, existing_file)
+    if request.endpoint in PROFILE_ENDPOINTS or 'all' in PROFILE_ENDPOINTS:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        request.environ['et.profiler'] = profiler
+
+@app.after_request
+def _record_request_metrics(response):
+    route = request.endpoint or 'unknown'
+    start = request.environ.get('et.start')
+    elapsed = time.perf_counter() - start if start is not None else 0.0
     
-    return send_file(existing_file, as_attachment=True)
+    metrics.registry.observe(
+        'et_request_seconds', elapsed,
+        help_text='Time from request start until the response is ready',
+        route=route, method=request.method, status=str(response.status_code)
+    )
+    if not response.is_streamed and not response.direct_passthrough:
+        metrics.registry.inc(
+            'et_response_bytes_total', response.calculate_content_length() or 0,
+            help_text='Response body bytes, per route', route=route
+        )
+    
+    # Streaming the body to the client happens after this hook returns
+    send_start = time.perf_counter()
+    response.call_on_close(lambda: metrics.registry.observe(
+        'et_stage_seconds', time.perf_counter() - send_start,
+        stage='send', route=route
+    ))
+    
+    profiler = request.environ.pop('et.profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        if elapsed >= PROFILE_MIN_SECONDS:
+            os.makedirs(PROFILE_FOLDER, exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            path = os.path.join(PROFILE_FOLDER, f'{route}_{timestamp}.prof')
+            profiler.dump_stats(path)
+            logger.info(f"Saved profile for {route} ({elapsed:.3f}s) to {path}")
+    
+    return response
+
+@app.teardown_request
+def _end_request_metrics(exc):
+    # Also runs when a view raised, so no profiler or route label leaks
+    profiler = request.environ.pop('et.profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    token = request.environ.pop('et.route_token', None)
+    if token is not None:
+        metrics.current_route.reset(token)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    # The debug reloader runs this block in a parent and a child process;
+    # only the child, which serves requests, watches the inputs
+    if WATCH_INPUTS and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        InputWatcher(INPUT_FOLDER, _process_inputs, interval=WATCH_INTERVAL).start()
     app.run(debug=True)
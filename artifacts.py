@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+# How long a generated artifact stays downloadable
+DEFAULT_TTL = 15 * 60
+# Upper bound on live handles, oldest dropped first
+DEFAULT_MAX_ITEMS = 256
+# Signing key shared by every process serving the same folder
+KEY_FILE = '.artifact_key'
+
+
+def _encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def shared_key(folder):
+    """Return the signing key kept in folder, creating it on first use
+
+    The key is written to a temporary file and linked into place, so
+    processes starting together all end up reading the same key.
+    """
+    path = os.path.join(folder, KEY_FILE)
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        pass
+    os.makedirs(folder, exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(secrets.token_bytes(32))
+        os.chmod(temp_path, 0o600)
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(temp_path)
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+class ArtifactStore:
+    """Short-lived artifacts addressed by opaque per-request handles.
+
+    Each entry holds either the artifact bytes or a path to it, together
+    with the download name and mimetype. Handles are unguessable, so
+    concurrent users never see each other's documents.
+
+    With a folder, artifacts stored as files in it get a signed handle
+    instead: the file name, download name, mimetype and expiry signed
+    with a key shared through the folder (or given as key). Any process
+    serving the folder can then resolve it, as under several gunicorn
+    workers; in-memory artifacts stay with the process that made them.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_items=DEFAULT_MAX_ITEMS, folder=None, key=None):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.folder = folder
+        self._key = key
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def _signing_key(self):
+        # Read on first use so importing the app doesn't touch the folder
+        if self._key is None:
+            self._key = shared_key(self.folder)
+        return self._key
+
+    def _sign(self, payload):
+        return _encode(hmac.new(self._signing_key(), payload, hashlib.sha256).digest()[:16])
+
+    def put(self, filename, mimetype, data=None, path=None):
+        """Store an artifact and return its handle"""
+        if self.folder and path and os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.folder):
+            payload = json.dumps(
+                [os.path.basename(path), filename, mimetype, int(time.time() + self.ttl)],
+                separators=(',', ':')
+            ).encode('utf-8')
+            return f'{_encode(payload)}.{self._sign(payload)}'
+
+        handle = secrets.token_urlsafe(16)
+        with self._lock:
+            self._purge()
+            self._items[handle] = {
+                'filename': filename,
+                'mimetype': mimetype,
+                'data': data,
+                'path': path,
+                'expires': time.monotonic() + self.ttl,
+            }
+            while len(self._items) > self.max_items:
+                # Dicts keep insertion order, so the first handle is the oldest
+                del self._items[next(iter(self._items))]
+        return handle
+
+    def get(self, handle):
+        """Return the artifact for handle, or None if unknown or expired"""
+        if '.' in handle:
+            return self._get_signed(handle)
+        with self._lock:
+            self._purge()
+            return self._items.get(handle)
+
+    def _get_signed(self, handle):
+        if not self.folder:
+            return None
+        encoded, _, signature = handle.partition('.')
+        try:
+            payload = _decode(encoded)
+        except ValueError:
+            return None
+        if not hmac.compare_digest(signature.encode('utf-8'), self._sign(payload).encode('ascii')):
+            return None
+        name, filename, mimetype, expires = json.loads(payload)
+        if expires <= time.time():
+            return None
+        return {
+            'filename': filename,
+            'mimetype': mimetype,
+            'data': None,
+            'path': os.path.join(os.path.abspath(self.folder), os.path.basename(name)),
+        }
+
+    def _purge(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        expired = [handle for handle, item in self._items.items() if item['expires'] <= now]
+        for handle in expired:
+            del self._items[handle]
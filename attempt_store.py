@@ -0,0 +1,224 @@
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    recorded_at REAL NOT NULL,
+    session TEXT,
+    question_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    number TEXT NOT NULL,
+    selected INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    seconds REAL
+);
+CREATE TABLE IF NOT EXISTS question_stats (
+    question_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    number TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    wrong INTEGER NOT NULL,
+    timed INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    last_attempt_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS question_stats_wrong ON question_stats (wrong DESC);
+CREATE TABLE IF NOT EXISTS topic_stats (
+    topic TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    wrong INTEGER NOT NULL
+);
+"""
+
+# Questions listed by most_missed unless a limit is given
+DEFAULT_MOST_MISSED = 20
+# Attempts accepted in one submit
+MAX_BATCH = 1000
+
+# Questions without a topic are stored under this key
+NO_TOPIC = ''
+
+_QUESTION_COLUMNS = 'question_id, topic, number, attempts, wrong, timed, seconds, last_attempt_at'
+
+
+def _error_rate(attempts, wrong):
+    return round(wrong / attempts, 4) if attempts else 0.0
+
+
+def _question_row(row):
+    question_id, topic, number, attempts, wrong, timed, seconds, last_attempt_at = row
+    return {
+        'id': question_id,
+        'topic': topic or None,
+        'number': number,
+        'attempts': attempts,
+        'wrong': wrong,
+        'error_rate': _error_rate(attempts, wrong),
+        'average_seconds': round(seconds / timed, 3) if timed else None,
+        'last_attempt_at': last_attempt_at,
+    }
+
+
+def parse_attempt(attempt):
+    """Validate one submitted attempt and return its (question id, selected mask, seconds)
+
+    An attempt is {"id": question id, "selected": [option indices],
+    "seconds": optional float}. Whether it was correct is not taken from
+    the client; see grade_attempt.
+    """
+    if not isinstance(attempt, dict):
+        raise ValueError('each attempt must be an object')
+    question_id = attempt.get('id')
+    if not isinstance(question_id, str) or not question_id:
+        raise ValueError('attempt is missing its question id')
+
+    selected = attempt.get('selected', [])
+    if not isinstance(selected, list) or not all(
+        isinstance(index, int) and not isinstance(index, bool) and 0 <= index < 32 for index in selected
+    ):
+        raise ValueError('selected must be a list of option indices')
+    mask = 0
+    for index in selected:
+        mask |= 1 << index
+
+    seconds = attempt.get('seconds')
+    if seconds is not None:
+        if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or seconds < 0:
+            raise ValueError('seconds must be a non-negative number')
+        seconds = float(seconds)
+    return question_id, mask, seconds
+
+
+def grade_attempt(question_id, question_data, mask, seconds):
+    """Return the attempt as recorded: the selection is correct only if it
+    is exactly the question's set of correct options
+    """
+    topic = question_data.topic
+    return (
+        question_id, str(topic) if topic is not None else NO_TOPIC, str(question_data.number),
+        mask, mask == question_data.correct_mask, seconds
+    )
+
+
+class AttemptStore:
+    """Append-only log of quiz attempts with running per-question aggregates.
+
+    Attempts are only ever inserted. Each batch updates the question and
+    topic totals in the same transaction, so the stats never need a scan
+    of the history and always agree with it. Questions are keyed by their
+    merge content hash, which stays the same across banks and renumbering;
+    topic and number are kept as last seen. The database runs in WAL
+    mode: readers are not blocked while a batch is written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.executescript(SCHEMA)
+
+    def _connection(self):
+        # SQLite connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def record(self, attempts, session=None):
+        """Append graded attempts (see grade_attempt) and update the aggregates
+
+        Returns the number of attempts recorded.
+        """
+        if not attempts:
+            return 0
+        now = time.time()
+        questions = defaultdict(lambda: [0, 0, 0, 0.0])
+        topics = defaultdict(lambda: [0, 0])
+        for question_id, topic, number, _, correct, seconds in attempts:
+            totals = questions[question_id, topic, number]
+            totals[0] += 1
+            totals[1] += not correct
+            if seconds is not None:
+                totals[2] += 1
+                totals[3] += seconds
+            topic_totals = topics[topic]
+            topic_totals[0] += 1
+            topic_totals[1] += not correct
+
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                'INSERT INTO attempts (recorded_at, session, question_id, topic, number, selected, correct, seconds) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(now, session, question_id, topic, number, mask, int(correct), seconds)
+                 for question_id, topic, number, mask, correct, seconds in attempts]
+            )
+            connection.executemany(
+                f'INSERT INTO question_stats ({_QUESTION_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (question_id) DO UPDATE SET '
+                'topic = excluded.topic, number = excluded.number, '
+                'attempts = attempts + excluded.attempts, wrong = wrong + excluded.wrong, '
+                'timed = timed + excluded.timed, seconds = seconds + excluded.seconds, '
+                'last_attempt_at = excluded.last_attempt_at',
+                [(question_id, topic, number, count, wrong, timed, seconds, now)
+                 for (question_id, topic, number), (count, wrong, timed, seconds) in questions.items()]
+            )
+            connection.executemany(
+                'INSERT INTO topic_stats VALUES (?, ?, ?) '
+                'ON CONFLICT (topic) DO UPDATE SET '
+                'attempts = attempts + excluded.attempts, wrong = wrong + excluded.wrong',
+                [(topic, count, wrong) for topic, (count, wrong) in topics.items()]
+            )
+        return len(attempts)
+
+    def question(self, question_id):
+        """Aggregates for one question, or None if it was never attempted"""
+        row = self._connection().execute(
+            f'SELECT {_QUESTION_COLUMNS} FROM question_stats WHERE question_id = ?', (question_id,)
+        ).fetchone()
+        return _question_row(row) if row else None
+
+    def questions(self):
+        """Aggregates for every attempted question, in topic and number order"""
+        rows = self._connection().execute(f'SELECT {_QUESTION_COLUMNS} FROM question_stats').fetchall()
+        rows.sort(key=lambda row: (row[1], int(row[2]) if row[2].isdigit() else 0, row[2], row[0]))
+        return [_question_row(row) for row in rows]
+
+    def most_missed(self, limit=DEFAULT_MOST_MISSED):
+        """Questions answered wrong most often, ties broken by error rate"""
+        rows = self._connection().execute(
+            f'SELECT {_QUESTION_COLUMNS} FROM question_stats '
+            'WHERE wrong > 0 ORDER BY wrong DESC, CAST(wrong AS REAL) / attempts DESC, topic, number, question_id '
+            'LIMIT ?', (limit,)
+        )
+        return [_question_row(row) for row in rows]
+
+    def topics(self):
+        rows = self._connection().execute('SELECT topic, attempts, wrong FROM topic_stats ORDER BY topic')
+        return [
+            {
+                'topic': topic or None,
+                'attempts': attempts,
+                'correct': attempts - wrong,
+                'accuracy': round(1 - wrong / attempts, 4) if attempts else None,
+            }
+            for topic, attempts, wrong in rows
+        ]
+
+    def totals(self):
+        attempts, wrong = self._connection().execute(
+            'SELECT COALESCE(SUM(attempts), 0), COALESCE(SUM(wrong), 0) FROM topic_stats'
+        ).fetchone()
+        questions = self._connection().execute('SELECT COUNT(*) FROM question_stats').fetchone()[0]
+        return {
+            'attempts': attempts,
+            'correct': attempts - wrong,
+            'accuracy': round(1 - wrong / attempts, 4) if attempts else None,
+            'questions_attempted': questions,
+        }
@@ -0,0 +1,210 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections.abc import Sequence
+
+from question_parser import iter_questions
+from question_record import QuestionRecord, mask_to_correct
+
+# Bump whenever the schema or the records produced by parse_question change
+INDEX_FORMAT_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE questions (
+    id INTEGER PRIMARY KEY,
+    number TEXT NOT NULL,
+    topic TEXT,
+    content TEXT NOT NULL,
+    options TEXT NOT NULL,
+    option_offsets BLOB NOT NULL,
+    correct INTEGER NOT NULL,
+    correct_raw TEXT
+);
+CREATE TABLE topics (
+    topic TEXT PRIMARY KEY,
+    question_count INTEGER NOT NULL,
+    first_id INTEGER NOT NULL,
+    last_id INTEGER NOT NULL
+);
+"""
+
+
+def index_path(index_folder, source_path):
+    """Location of the compiled index for a source bank
+
+    The name carries a hash of the absolute source path, so banks with
+    the same file name in different folders get separate indexes.
+    """
+    name = os.path.basename(source_path)
+    path_hash = hashlib.sha256(os.path.abspath(source_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(index_folder, f'{name}.{path_hash}.bank.sqlite')
+
+
+def _encode_options(options):
+    """Pack options into one string plus the end offset of each option"""
+    offsets = array('I')
+    end = 0
+    for option in options:
+        end += len(option)
+        offsets.append(end)
+    return ''.join(options), offsets.tobytes()
+
+
+def _decode_options(text, offset_bytes):
+    offsets = array('I')
+    offsets.frombytes(offset_bytes)
+    options = []
+    start = 0
+    for end in offsets:
+        options.append(text[start:end])
+        start = end
+    return options
+
+
+def build_index(source_path, target_path, fingerprint):
+    """Compile a raw question dump into an SQLite index at target_path"""
+    size, mtime_ns, digest = fingerprint
+    temp_path = f'{target_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    connection = sqlite3.connect(temp_path)
+    try:
+        connection.executescript(SCHEMA)
+        topics = {}
+        rows = []
+        with open(source_path, 'rb') as file:
+            for question_id, question_data in enumerate(iter_questions(file)):
+                options, offsets = _encode_options(question_data.options)
+                correct = question_data.correct
+                mask = question_data.correct_mask
+                # The bitmask loses order and repeats; keep the raw letters when that matters
+                correct_raw = None if mask_to_correct(mask) == correct else ''.join(correct)
+                rows.append((
+                    question_id, question_data.number, question_data.topic,
+                    question_data.content, options, offsets, mask, correct_raw,
+                ))
+
+                topic = question_data.topic
+                if topic is not None:
+                    count, first_id, _ = topics.get(topic, (0, question_id, question_id))
+                    topics[topic] = (count + 1, first_id, question_id)
+
+                if len(rows) >= 1000:
+                    connection.executemany('INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                    rows = []
+
+        connection.executemany('INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        connection.executemany(
+            'INSERT INTO topics VALUES (?, ?, ?, ?)',
+            [(topic, count, first_id, last_id) for topic, (count, first_id, last_id) in topics.items()]
+        )
+        connection.executemany('INSERT INTO meta VALUES (?, ?)', [
+            ('format_version', str(INDEX_FORMAT_VERSION)),
+            ('source_size', str(size)),
+            ('source_mtime_ns', str(mtime_ns)),
+            ('source_sha256', digest),
+        ])
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(temp_path, target_path)
+
+
+class CompiledBank(Sequence):
+    """Read-only sequence of the QuestionRecords in a compiled bank index.
+
+    The SQLite file is memory-mapped and rows are only read when they are
+    accessed, so opening a bank is cheap regardless of its size.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._length = None
+
+    def _connection(self):
+        # SQLite connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            connection.execute('PRAGMA mmap_size = 268435456')
+            self._local.connection = connection
+        return connection
+
+    def meta(self):
+        return dict(self._connection().execute('SELECT key, value FROM meta'))
+
+    def __len__(self):
+        # The index is never modified once built
+        if self._length is None:
+            self._length = self._connection().execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0:
+            raise IndexError(index)
+        row = self._connection().execute(
+            'SELECT number, topic, content, options, option_offsets, correct, correct_raw '
+            'FROM questions WHERE id = ?', (index,)
+        ).fetchone()
+        if row is None:
+            raise IndexError(index)
+        return self._record(row)
+
+    def __iter__(self):
+        cursor = self._connection().execute(
+            'SELECT number, topic, content, options, option_offsets, correct, correct_raw '
+            'FROM questions ORDER BY id'
+        )
+        for row in cursor:
+            yield self._record(row)
+
+    def __reduce__(self):
+        # Connections stay with their process; a copy opens its own
+        return CompiledBank, (self.path,)
+
+    def topics(self):
+        """Return {topic: (question_count, first_id, last_id)}"""
+        rows = self._connection().execute('SELECT topic, question_count, first_id, last_id FROM topics')
+        return {topic: (count, first_id, last_id) for topic, count, first_id, last_id in rows}
+
+    @staticmethod
+    def _record(row):
+        number, topic, content, options, offsets, mask, correct_raw = row
+        return QuestionRecord(
+            number, topic, content, _decode_options(options, offsets),
+            correct_raw if correct_raw is not None else mask
+        )
+
+
+def _is_current(path, fingerprint):
+    try:
+        meta = CompiledBank(path).meta()
+    except sqlite3.Error:
+        return False
+    size, mtime_ns, digest = fingerprint
+    return (
+        meta.get('format_version') == str(INDEX_FORMAT_VERSION)
+        and meta.get('source_sha256') == digest
+    )
+
+
+def open_compiled_bank(source_path, index_folder, fingerprint):
+    """Open the compiled index for source_path, rebuilding it if it is stale
+
+    fingerprint is the (size, mtime_ns, sha256) of the source file.
+    """
+    os.makedirs(index_folder, exist_ok=True)
+    path = index_path(index_folder, source_path)
+    if not os.path.exists(path) or not _is_current(path, fingerprint):
+        build_index(source_path, path, fingerprint)
+    return CompiledBank(path)
@@ -0,0 +1,486 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+
+from metrics import stage
+from question_bank import bank_cache
+from question_parser import clean_texts
+
+# Bumped whenever normalisation or matching changes what a merge keeps
+MERGE_VERSION = 3
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Word n-grams compared for near-duplicates
+SHINGLE_SIZE = 3
+# MinHash signature bins, split into LSH bands of BAND_ROWS rows; 16
+# bands of 8 rows make pairs at 0.8 Jaccard candidates ~95% of the time
+# and pairs at 0.5 only ~6%
+NUM_BINS = 128
+BAND_ROWS = 8
+# Candidates at or above this shingle Jaccard similarity are duplicates
+DEFAULT_NEAR_THRESHOLD = 0.8
+# Candidates whose signatures agree on fewer bins than the threshold
+# minus this are skipped without computing their exact similarity
+SIGNATURE_SLACK = 0.15
+# Kept questions recorded per LSH bucket. A band value shared by this
+# many questions says little about any pair of them, e.g. when common
+# phrases win the same bins, so a full bucket is no longer scanned
+MAX_BUCKET_SIZE = 32
+
+# Merged results and per-bank signatures kept in memory and on disk
+MAX_MERGES = 4
+MAX_BANK_FEATURES = 16
+
+_MASK64 = (1 << 64) - 1
+_BIN_BITS = NUM_BINS.bit_length() - 1
+_VALUE_MASK = (1 << (64 - _BIN_BITS)) - 1
+# Multiplicative hashing constant (2**64 / golden ratio)
+_MIX = 0x9E3779B97F4A7C15
+
+# Lowest bit of every 16-bit bin of a signature held as an integer
+_BIN_LOW_BITS = int.from_bytes(b'\x01\x00' * NUM_BINS, 'little')
+
+# Features file header: magic, bins per signature, question count
+_FEATURES_HEADER = struct.Struct('<4sII')
+_FEATURES_MAGIC = b'ETMF'
+
+
+def normalize_tokens(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def _normalize(question_data):
+    content = normalize_tokens(question_data['content'])
+    cleaned = [' '.join(normalize_tokens(option)) for option in clean_texts(question_data['options'])]
+    return content, cleaned, sorted(cleaned)
+
+
+def _shingle_hashes(content, options):
+    words = content + [word for option in options for word in option.split()]
+    if len(words) < SHINGLE_SIZE:
+        shingles = {' '.join(words)}
+    else:
+        shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return frozenset(zlib.crc32(shingle.encode('utf-8')) for shingle in shingles)
+
+
+def question_shingles(question_data):
+    """Return the set of shingle hashes compared for near-duplicates"""
+    content, _, options = _normalize(question_data)
+    return _shingle_hashes(content, options)
+
+
+def question_features(question_data):
+    """Return (content hash, MinHash signature, answers key) for a question
+
+    Options are cleaned of vote counts, links and timestamps and sorted,
+    so dumps that differ only in that noise or in option order hash alike.
+    The answers key hashes the normalised correct option texts, which
+    compares the marked answers of two questions with the same content hash.
+    """
+    content, cleaned, options = _normalize(question_data)
+    answers = sorted({
+        cleaned[index] for index in (ord(letter) - ord('A') for letter in question_data['correct'])
+        if 0 <= index < len(cleaned)
+    })
+    answers_key = int.from_bytes(hashlib.sha1('\x1f'.join(answers).encode('utf-8')).digest()[:8], 'little')
+    key = ' '.join(content) + '\x1e' + '\x1f'.join(options)
+    content_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return content_hash, minhash_signature(_shingle_hashes(content, options)), answers_key
+
+
+def _bin_fingerprint(value):
+    # 16 bits of a remixed bin minimum; signatures only need to tell bins apart
+    return ((value * _MIX) & _MASK64) >> 48
+
+
+def minhash_signature(hashes):
+    """One-permutation MinHash as an array of 16-bit bin fingerprints
+
+    Each shingle hash is mixed once, its top bits pick a bin and the rest
+    compete for that bin's minimum. Empty bins borrow the next filled bin
+    to the right, offset by the distance, so sparse questions still get
+    comparable signatures.
+    """
+    bins = [None] * NUM_BINS
+    for value in hashes:
+        mixed = (value * _MIX) & _MASK64
+        index = mixed >> (64 - _BIN_BITS)
+        value = mixed & _VALUE_MASK
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+
+    if not hashes:
+        return array('H', bytes(2 * NUM_BINS))
+    signature = [0 if value is None else ((value * _MIX) & _MASK64) >> 48 for value in bins]
+    if None in bins:
+        # Sweep right to left; the first filled bin, shifted by NUM_BINS,
+        # serves the empty bins at the end
+        filled = bins.index(next(value for value in bins if value is not None)) + NUM_BINS
+        for index in range(NUM_BINS - 1, -1, -1):
+            if bins[index] is not None:
+                filled = index
+            else:
+                signature[index] = _bin_fingerprint(bins[filled % NUM_BINS] + filled - index)
+    return array('H', signature)
+
+
+def differing_bins(first, second):
+    """Number of bins in which two signatures, as little-endian integers, differ"""
+    diff = first ^ second
+    # Fold each bin's 16 bits into its lowest bit; bits shifted down from
+    # the next bin never reach that lowest bit
+    diff |= diff >> 1
+    diff |= diff >> 2
+    diff |= diff >> 4
+    diff |= diff >> 8
+    return (diff & _BIN_LOW_BITS).bit_count()
+
+
+def jaccard(first, second):
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+class BankFeatures:
+    """Content hashes, answers keys and signatures of every question of a bank"""
+
+    def __init__(self, hashes, answers, signatures):
+        self.hashes = hashes
+        self.answers = answers
+        self.signatures = signatures
+        self._signature_bytes = memoryview(signatures).cast('B')
+
+    @classmethod
+    def compute(cls, questions):
+        hashes = []
+        answers = array('Q')
+        signatures = array('H')
+        for question_data in questions:
+            content_hash, signature, answers_key = question_features(question_data)
+            hashes.append(content_hash)
+            answers.append(answers_key)
+            signatures.extend(signature)
+        return cls(hashes, answers, signatures)
+
+    def signature(self, index):
+        """The signature of a question as bytes, two per bin"""
+        return self._signature_bytes[index * 2 * NUM_BINS:(index + 1) * 2 * NUM_BINS].tobytes()
+
+    def save(self, path):
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'wb') as file:
+                file.write(_FEATURES_HEADER.pack(_FEATURES_MAGIC, NUM_BINS, len(self.hashes)))
+                file.write(b''.join(bytes.fromhex(content_hash) for content_hash in self.hashes))
+                self.answers.tofile(file)
+                self.signatures.tofile(file)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @classmethod
+    def load(cls, path):
+        """Read features written by save(), or None if the file is missing or unusable"""
+        try:
+            with open(path, 'rb') as file:
+                magic, bins, count = _FEATURES_HEADER.unpack(file.read(_FEATURES_HEADER.size))
+                if magic != _FEATURES_MAGIC or bins != NUM_BINS:
+                    return None
+                digests = file.read(20 * count)
+                answers = array('Q')
+                answers.fromfile(file, count)
+                signatures = array('H')
+                signatures.fromfile(file, count * NUM_BINS)
+        except (OSError, EOFError, struct.error):
+            return None
+        hashes = [digests[i:i + 20].hex() for i in range(0, len(digests), 20)]
+        return cls(hashes, answers, signatures)
+
+
+class MergedBank:
+    """Questions from several banks with duplicates removed.
+
+    questions holds the kept QuestionRecords (shared with the bank cache)
+    in bank order and ids their content hashes, which identify a question
+    across banks and merges. duplicates lists every dropped question as a
+    dict naming it, the question it duplicates and the similarity;
+    exact duplicates whose marked answers differ from the kept question's
+    also carry answers_differ, since only the first bank's answers are kept.
+    """
+
+    def __init__(self, fingerprint, sources, questions, ids, duplicates, stats):
+        self.fingerprint = fingerprint
+        self.sources = sources
+        self.questions = questions
+        self.ids = ids
+        self.duplicates = duplicates
+        self.stats = stats
+
+    # Merges of the same inputs are interchangeable, e.g. as cache keys
+    def __eq__(self, other):
+        return isinstance(other, MergedBank) and other.fingerprint == self.fingerprint
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+
+def _pick(bank, indices):
+    """The questions of bank at the given ascending indices, in one pass"""
+    if isinstance(bank, list):
+        return [bank[index] for index in indices]
+    wanted = set(indices)
+    return [question_data for index, question_data in enumerate(bank) if index in wanted]
+
+
+class BankMerger:
+    """Merges every input bank into one deduplicated question set.
+
+    Exact duplicates share a normalised content hash. Reworded
+    near-duplicates are found with MinHash signatures and LSH banding,
+    so only questions sharing a band are considered; candidates whose
+    signatures clearly disagree are skipped and the rest are dropped when
+    their shingle Jaccard similarity to a kept question reaches
+    near_threshold. Banks are merged in path order and the first
+    occurrence wins, so the result is deterministic. Features are cached
+    per bank content hash, so adding a bank only hashes that bank. With a
+    folder, features and merge results are also written there and reused
+    by later processes.
+    """
+
+    def __init__(self, near_threshold=DEFAULT_NEAR_THRESHOLD, folder=None):
+        # None or 0 disables near-duplicate detection
+        self.near_threshold = near_threshold
+        self.folder = folder
+        self._features = OrderedDict()
+        self._merges = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        os.makedirs(self.folder, exist_ok=True)
+        return os.path.join(self.folder, name)
+
+    def _bank_features(self, fingerprint, questions):
+        with self._lock:
+            features = self._features.get(fingerprint)
+            if features is not None:
+                self._features.move_to_end(fingerprint)
+                return features
+
+        path = self._path(f'{fingerprint}.merge{MERGE_VERSION}.features') if self.folder else None
+        features = None
+        if path and os.path.exists(path):
+            with stage('load_merge'):
+                features = BankFeatures.load(path)
+        if features is None:
+            with stage('minhash'):
+                features = BankFeatures.compute(questions)
+            if path:
+                features.save(path)
+                self._prune('.features', MAX_BANK_FEATURES)
+
+        with self._lock:
+            self._features[fingerprint] = features
+            while len(self._features) > MAX_BANK_FEATURES:
+                self._features.popitem(last=False)
+        return features
+
+    def merge(self, paths):
+        """Return the MergedBank for the given bank files"""
+        paths = sorted(paths)
+        sources = [(path, bank_cache.fingerprint(path)) for path in paths]
+        key = hashlib.sha256(
+            repr((MERGE_VERSION, self.near_threshold, [(os.path.basename(p), f) for p, f in sources])).encode()
+        ).hexdigest()
+
+        with self._lock:
+            merged = self._merges.get(key)
+            if merged is not None:
+                self._merges.move_to_end(key)
+                return merged
+
+        merged = self._load(key, sources) if self.folder else None
+        if merged is None:
+            with stage('merge'):
+                merged, kept = self._merge(key, sources)
+            if self.folder:
+                self._save(merged, kept)
+
+        with self._lock:
+            self._merges[key] = merged
+            while len(self._merges) > MAX_MERGES:
+                self._merges.popitem(last=False)
+        return merged
+
+    def _save(self, merged, kept):
+        """Write a merge result; kept lists the kept question indices of each source"""
+        path = self._path(f'{merged.fingerprint}.merge.json')
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'kept': kept,
+                    'ids': merged.ids,
+                    'duplicates': merged.duplicates,
+                    'stats': merged.stats,
+                }, file)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._prune('.merge.json', MAX_MERGES)
+
+    def _load(self, key, sources):
+        path = self._path(f'{key}.merge.json')
+        if not os.path.exists(path):
+            return None
+        with stage('load_merge'):
+            try:
+                with open(path, encoding='utf-8') as file:
+                    data = json.load(file)
+                questions = []
+                for (source_path, _), indices in zip(sources, data['kept'], strict=True):
+                    questions.extend(_pick(bank_cache.get(source_path), indices))
+            except (OSError, ValueError, KeyError, TypeError):
+                return None
+            if len(questions) != len(data['ids']):
+                return None
+            os.utime(path)
+        return MergedBank(key, [path for path, _ in sources], questions, data['ids'], data['duplicates'], data['stats'])
+
+    def _prune(self, suffix, keep):
+        """Remove all but the keep most recently used files ending in suffix"""
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(suffix):
+                try:
+                    entries.append((os.stat(os.path.join(self.folder, name)).st_mtime, name))
+                except OSError:
+                    continue
+        for _, name in sorted(entries)[:-keep]:
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
+
+    def _merge(self, key, sources):
+        questions = []
+        ids = []
+        duplicates = []
+        per_bank = {}
+        seen = {}
+        buckets = {}
+        near = bool(self.near_threshold)
+        max_differing = (1 - self.near_threshold + SIGNATURE_SLACK) * NUM_BINS if near else 0
+        band_size = 2 * BAND_ROWS
+        bands = range(NUM_BINS // BAND_ROWS)
+        # Kept question indices of each source, for saving the result
+        kept = [[] for _ in sources]
+        # Per kept question: its reference, signature (as an integer) and answers key
+        kept_refs = []
+        kept_signatures = []
+        kept_answers = []
+        # Shingles of kept questions, computed only once they are compared
+        kept_shingles = {}
+
+        for source, (path, fingerprint) in enumerate(sources):
+            bank = bank_cache.get(path)
+            name = os.path.basename(path)
+            counts = per_bank[name] = {
+                'questions': len(bank), 'kept': 0, 'exact': 0, 'near': 0, 'answer_conflicts': 0
+            }
+
+            features = self._bank_features(fingerprint, bank)
+            for index, question_data in enumerate(bank):
+                content_hash = features.hashes[index]
+                answers_key = features.answers[index]
+                ref = {'bank': name, 'number': question_data['number']}
+
+                original = seen.get(content_hash)
+                if original is not None:
+                    counts['exact'] += 1
+                    duplicate = {'question': ref, 'duplicate_of': kept_refs[original], 'similarity': 1.0}
+                    if answers_key != kept_answers[original]:
+                        counts['answer_conflicts'] += 1
+                        duplicate['answers_differ'] = True
+                    duplicates.append(duplicate)
+                    continue
+
+                match = None
+                band_keys = []
+                if near:
+                    signature = features.signature(index)
+                    band_keys = [(band, signature[band * band_size:(band + 1) * band_size]) for band in bands]
+                    signature = int.from_bytes(signature, 'little')
+                    candidates = set()
+                    for band_key in band_keys:
+                        bucket = buckets.get(band_key)
+                        if bucket and len(bucket) < MAX_BUCKET_SIZE:
+                            candidates.update(bucket)
+                    shingles = None
+                    for candidate in sorted(candidates):
+                        if differing_bins(signature, kept_signatures[candidate]) > max_differing:
+                            continue
+                        if shingles is None:
+                            shingles = question_shingles(question_data)
+                        other = kept_shingles.get(candidate)
+                        if other is None:
+                            other = kept_shingles[candidate] = question_shingles(questions[candidate])
+                        similarity = jaccard(shingles, other)
+                        if similarity >= self.near_threshold:
+                            match = (candidate, similarity)
+                            break
+
+                if match is not None:
+                    counts['near'] += 1
+                    duplicates.append({
+                        'question': ref,
+                        'duplicate_of': kept_refs[match[0]],
+                        'similarity': round(match[1], 3)
+                    })
+                    continue
+
+                position = len(questions)
+                seen[content_hash] = position
+                kept_refs.append(ref)
+                kept_answers.append(answers_key)
+                kept[source].append(index)
+                if near:
+                    kept_signatures.append(signature)
+                    for band_key in band_keys:
+                        bucket = buckets.setdefault(band_key, [])
+                        if len(bucket) < MAX_BUCKET_SIZE:
+                            bucket.append(position)
+                questions.append(question_data)
+                ids.append(content_hash)
+                counts['kept'] += 1
+
+        stats = {
+            'banks': per_bank,
+            'questions': sum(counts['questions'] for counts in per_bank.values()),
+            'kept': len(questions),
+            'exact_duplicates': sum(counts['exact'] for counts in per_bank.values()),
+            'near_duplicates': sum(counts['near'] for counts in per_bank.values()),
+            'answer_conflicts': sum(counts['answer_conflicts'] for counts in per_bank.values()),
+            'near_threshold': self.near_threshold,
+        }
+        return MergedBank(key, [path for path, _ in sources], questions, ids, duplicates, stats), kept
+
+    def clear(self):
+        """Drop the in-memory caches; files in folder are kept"""
+        with self._lock:
+            self._features.clear()
+            self._merges.clear()
+
+
+# Shared by the quiz and document routes
+bank_merger = BankMerger()
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+
+from metrics import count_bytes, count_questions, stage
+from question_bank import bank_cache
+from question_parser import iter_question_blocks, parse_question
+
+# Largest upload accepted, in bytes
+DEFAULT_MAX_UPLOAD_BYTES = 1024 * 1024 * 1024
+# Longest line accepted; a block is never held beyond its own lines
+MAX_LINE_BYTES = 1024 * 1024
+# Bytes read from the request per call; server streams such as
+# werkzeug's dechunker are very slow when asked for lines instead
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """The upload was rejected; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class _TeeReader:
+    """readline() over a request stream that also writes and hashes every byte"""
+
+    def __init__(self, stream, file, max_bytes):
+        self.stream = stream
+        self.file = file
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self._buffer = b''
+        self._position = 0
+        self._eof = False
+
+    def _fill(self):
+        chunk = self.stream.read(READ_SIZE)
+        if not chunk:
+            self._eof = True
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadError(f'Uploads are limited to {self.max_bytes} bytes', status=413)
+        self.file.write(chunk)
+        self.digest.update(chunk)
+        self._buffer = self._buffer[self._position:] + chunk
+        self._position = 0
+
+    def readline(self):
+        while True:
+            end = self._buffer.find(b'\n', self._position)
+            if end >= 0 or self._eof:
+                end = end + 1 if end >= 0 else len(self._buffer)
+                line = self._buffer[self._position:end]
+                self._position = end
+                return line
+            if len(self._buffer) - self._position > MAX_LINE_BYTES:
+                raise UploadError(f'Lines longer than {MAX_LINE_BYTES} bytes are not accepted')
+            self._fill()
+
+
+def ingest_stream(stream, target_path, max_bytes=DEFAULT_MAX_UPLOAD_BYTES, replace=False):
+    """Store a raw question dump read from stream at target_path, parsing it on the way
+
+    Blocks are parsed as soon as their closing separator arrives and the
+    next bytes are only read once that is done, so the raw text held is
+    bounded by the longest block and a slow parse slows the sender down
+    instead of buffering the body. The file only appears at target_path once the
+    whole upload was read and it holds at least one question; the parsed
+    questions are put straight into the bank cache. Unless replace is set
+    an existing file is never overwritten, even one created while the
+    upload was being read. Returns a summary with the accepted and rejected
+    question counts.
+    """
+    temp_path = f'{target_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    accepted = []
+    rejected = 0
+    try:
+        with open(temp_path, 'wb') as file, stage('upload'):
+            reader = _TeeReader(stream, file, max_bytes)
+            for question_text in iter_question_blocks(reader):
+                if not question_text.strip():
+                    continue
+                question_data = parse_question(question_text)
+                if question_data:
+                    accepted.append(question_data)
+                else:
+                    rejected += 1
+        count_bytes(reader.size)
+        count_questions(len(accepted))
+
+        if not accepted:
+            raise UploadError('No valid questions found in the upload', status=422)
+        if replace:
+            os.replace(temp_path, target_path)
+        else:
+            # Linking fails if the name exists, so concurrent uploads can't both win
+            try:
+                os.link(temp_path, target_path)
+            except FileExistsError:
+                raise UploadError(f'{os.path.basename(target_path)} already exists', status=409)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    stat = os.stat(target_path)
+    digest = reader.digest.hexdigest()
+    bank_cache.put(target_path, accepted, (stat.st_size, stat.st_mtime_ns, digest))
+    return {
+        'bytes': reader.size,
+        'sha256': digest,
+        'accepted': len(accepted),
+        'rejected': rejected,
+    }
@@ -0,0 +1,101 @@
+"""Differential check of the fused text cleaning against the original passes.
+
+clean_special_characters and clean_texts are compared with the step by
+step implementation they replaced, over every question block, section
+and line of the bundled bank (raw, stripped and already cleaned) plus
+random strings built from the characters the patterns care about. Run
+it after any change to the cleaning patterns in question_parser.py:
+
+    python benchmarks/check_cleaning.py
+    python benchmarks/check_cleaning.py --bank inputs/other.txt --random 100000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from question_parser import (  # noqa: E402
+    QUESTION_SEPARATOR, SECTION_SEPARATOR, clean_special_characters, clean_texts
+)
+
+# Fragments random inputs are assembled from
+RANDOM_PIECES = (
+    'a', 'Z', '9', '12', ' ', '  ', '\t', '\n', '\r', '.', ',', ':', '-', '(', ')', '*', '#', '/', '_',
+    'é', '→', ' ', 'http://x.io/a?b=1', 'https://', 'voted 3 times', 'Upvoted 12 time',
+    '2 days ago', '1 year, 3 months ago', '5 weeks', 'Selected Answer: B', 'Chosen Answer:',
+    'Community vote', 'Most Voted', '***', 'A. ', 'B. ',
+)
+
+
+def legacy_clean(text):
+    """clean_special_characters as it was before the passes were fused"""
+    if not text:
+        return text
+    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
+    text = re.sub(r'\d{1,2}\s*(year|month|week|day)s?(,?\s*\d{1,2}\s*(year|month|week|day)s?)?\s*ago', '', text)
+    text = re.sub(r'(?i)upvoted\s*\d+\s*times?', '', text)
+    text = re.sub(r'(?i)voted\s*\d+\s*times?', '', text)
+    text = re.sub(r'Selected Answer:.*', '', text)
+    text = re.sub(r'Chosen Answer:.*', '', text)
+    text = re.sub(r'Community.*', '', text)
+    text = re.sub(r'[^\w\s.,():-]', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def bank_samples(path):
+    """Every block, section and line of a bank, raw, stripped and cleaned"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        content = file.read()
+    texts = []
+    for block in content.split(QUESTION_SEPARATOR):
+        texts.append(block)
+        for section in block.split(SECTION_SEPARATOR):
+            texts.append(section)
+            for line in section.split('\n'):
+                texts.extend((line, line.strip()))
+    texts += [legacy_clean(text) for text in texts]
+    return texts
+
+
+def random_samples(count, seed):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(RANDOM_PIECES) for _ in range(rng.randint(0, 12))) for _ in range(count)]
+
+
+def check(texts):
+    """Return the texts whose cleaned form differs from the legacy one"""
+    mismatches = []
+    for text in texts:
+        if clean_special_characters(text) != legacy_clean(text):
+            mismatches.append(text)
+    # Batches exercise the single removal scan of clean_texts
+    for start in range(0, len(texts), 7):
+        batch = texts[start:start + 7]
+        for text, cleaned in zip(batch, clean_texts(batch)):
+            if cleaned != legacy_clean(text):
+                mismatches.append(text)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bank', default=os.path.join(REPO_ROOT, 'inputs', 'snowpro-core.txt'))
+    parser.add_argument('--random', type=int, default=20000, help='random strings to compare')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    texts = bank_samples(args.bank) + random_samples(args.random, args.seed)
+    mismatches = check(texts)
+    print(f'{len(texts)} texts compared, {len(mismatches)} mismatches')
+    for text in mismatches[:10]:
+        print(f'MISMATCH {text!r}: {clean_special_characters(text)!r} != {legacy_clean(text)!r}', file=sys.stderr)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Write synthetic question dumps in the raw input format.
+
+The output follows the layout of inputs/snowpro-core.txt: a
+"Question #:" header with topic and link, "-----" separated question and
+option sections, a "CORRECT ANSWER==:" line and a "####" separator. Some
+options carry the noise that clean_special_characters strips (links,
+vote counts, timestamps, "Most Voted" markers).
+
+    python benchmarks/generate_dump.py 100000 -o /tmp/bank_100k.txt
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_parser import QUESTION_SEPARATOR, SECTION_SEPARATOR  # noqa: E402
+
+WORDS = (
+    'warehouse clustering keys micro-partitions virtual stage pipe stream task '
+    'role SECURITYADMIN SYSADMIN ACCOUNTADMIN table schema database share '
+    'replication failover time travel fail-safe retention query cache result '
+    'credit storage compute scaling policy economy standard multi-cluster '
+    'external function masking policy row access secure view materialized '
+    'snowpipe copy into file format json parquet variant flatten'
+).split()
+
+OPTION_NOISE = (
+    ' https://docs.snowflake.com/en/user-guide/intro-key-concepts',
+    ' upvoted 12 times',
+    ' 2 months, 1 week ago',
+    ' (Choose this one!)',
+)
+
+
+def _sentence(rng, low, high):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+    return ' '.join(words).capitalize()
+
+
+def question_block(rng, number, topic):
+    """Return one raw question in dump format, separator included"""
+    option_count = rng.randint(2, 5)
+    letters = 'ABCDE'[:option_count]
+    # parse_question only recognises A-D as answer letters
+    answer_letters = letters[:4]
+    multi = option_count >= 4 and rng.random() < 0.2
+    correct = ''.join(sorted(rng.sample(answer_letters, 2 if multi else 1)))
+
+    lines = [
+        f'Question #: {number}',
+        f'Topic #: {topic}',
+        f'Question link: https://www.examtopics.com/discussions/snowflake/view/{70000 + number}'
+        f'-exam-snowpro-core-topic-{topic}-question-{number}-discussion/',
+        SECTION_SEPARATOR,
+        _sentence(rng, 8, 30) + ('? (Choose two.)' if multi else '?'),
+        SECTION_SEPARATOR,
+    ]
+    for letter in letters:
+        option = f'{letter}. {_sentence(rng, 1, 8)}'
+        if letter in correct:
+            option += ' ***Most Voted***'
+        if rng.random() < 0.1:
+            option += rng.choice(OPTION_NOISE)
+        lines.append(option)
+    lines += [
+        SECTION_SEPARATOR,
+        f'CORRECT ANSWER==: {correct}',
+        QUESTION_SEPARATOR,
+        '',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def write_dump(path, count, seed=0, questions_per_topic=1000):
+    """Write a dump with count questions to path and return its size in bytes"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('SYNTHETIC EXAM TOPIC QUESTION DUMP\n\n\n\n')
+        for number in range(1, count + 1):
+            topic = (number - 1) // questions_per_topic + 1
+            file.write(question_block(rng, number, topic))
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic question dump.')
+    parser.add_argument('count', type=int, help='number of questions (e.g. 1000 to 1000000)')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    size = write_dump(args.output, args.count, seed=args.seed)
+    print(f'Wrote {args.count} questions ({size / 1024 / 1024:.1f} MB) to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Quiz latency while spreadsheets are being built.
+
+Starts serve.py on a free local port and measures GET /get_questions
+latency from --readers client threads, first on an idle server and then
+while --builders threads keep POSTing large /export_results xlsx builds.
+This is repeated for each BUILD_WORKERS setting in --modes (0 builds in
+the request thread, as the dev server used to), so the percentiles show
+what moving builds onto the bounded executor does to read tail latency.
+Builds turned away with 503 are counted, not retried.
+
+    python benchmarks/load_test.py --modes 0,2 --duration 10 -o load.json
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _request(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def _wait_ready(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            if _request(port, 'GET', '/get_questions?limit=1') == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('server did not become ready')
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return {'requests': 0}
+    ordered = sorted(latencies)
+
+    def at(fraction):
+        return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] * 1000, 1)
+
+    return {
+        'requests': len(ordered),
+        'p50_ms': at(0.50),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': round(ordered[-1] * 1000, 1),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 1),
+    }
+
+
+def _phase(port, readers, builders, duration, export_body):
+    stop = threading.Event()
+    latencies = []
+    builds = {'ok': 0, 'rejected': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def read_loop():
+        while not stop.is_set():
+            start = time.perf_counter()
+            status = _request(port, 'GET', '/get_questions?limit=20')
+            elapsed = time.perf_counter() - start
+            if status == 200:
+                with lock:
+                    latencies.append(elapsed)
+
+    def build_loop():
+        while not stop.is_set():
+            status = _request(port, 'POST', '/export_results', body=export_body,
+                              headers={'Content-Type': 'application/json'})
+            key = 'ok' if status == 200 else 'rejected' if status == 503 else 'failed'
+            with lock:
+                builds[key] += 1
+            if status == 503:
+                time.sleep(0.05)
+
+    threads = [threading.Thread(target=build_loop) for _ in range(builders)]
+    threads += [threading.Thread(target=read_loop) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    result = {'get_questions': _percentiles(latencies)}
+    if builders:
+        result['builds'] = builds
+    return result
+
+
+def run_mode(build_workers, args, export_body):
+    port = _free_port()
+    env = dict(os.environ, BUILD_WORKERS=str(build_workers))
+    if args.build_queue is not None:
+        env['BUILD_QUEUE'] = str(args.build_queue)
+    process = subprocess.Popen(
+        [sys.executable, 'serve.py', '--port', str(port)],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_ready(port, process)
+        return {
+            'build_workers': build_workers,
+            'idle': _phase(port, args.readers, 0, args.duration, export_body),
+            'loaded': _phase(port, args.readers, args.builders, args.duration, export_body),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='0,2', help='comma separated BUILD_WORKERS values to compare')
+    parser.add_argument('--build-queue', type=int, help='BUILD_QUEUE for the server')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--builders', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=20000, help='rows per exported spreadsheet')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per phase')
+    parser.add_argument('-o', '--output', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    export_body = json.dumps({'results': [
+        {
+            'Question Number': str(number),
+            'Question': f'Question {number} text that is long enough to look like a real one',
+            'Your Answers': 'A. An answer that was wrong',
+            'Correct Answers': 'B. The answer that was right',
+        }
+        for number in range(args.rows)
+    ]}).encode()
+
+    results = []
+    for mode in args.modes.split(','):
+        result = run_mode(int(mode), args, export_body)
+        results.append(result)
+        loaded = result['loaded']
+        print(
+            f"BUILD_WORKERS={result['build_workers']}: /get_questions p99 "
+            f"{result['idle']['get_questions'].get('p99_ms')} ms idle, "
+            f"{loaded['get_questions'].get('p99_ms')} ms under load; builds {loaded['builds']}",
+            file=sys.stderr
+        )
+
+    summary = {'benchmark': 'load', 'readers': args.readers, 'builders': args.builders,
+               'rows': args.rows, 'duration': args.duration, 'results': results}
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(summary, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
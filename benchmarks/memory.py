@@ -0,0 +1,141 @@
+"""Per-question memory footprint of parsed banks.
+
+Compares the retained Python allocations of QuestionRecords against the
+plain dicts parse_question used to return, for the parsed bank and for
+the quiz layer /get_questions keeps on top of it (which used to be a
+second dict per question). Sizes come from tracemalloc, so they cover
+every object a representation keeps alive, strings included.
+
+    python benchmarks/memory.py --sizes 10000,100000 -o memory.json
+    python benchmarks/memory.py --min-reduction 30
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_dump import write_dump  # noqa: E402
+from question_parser import QUESTION_SEPARATOR, clean_texts, parse_question  # noqa: E402
+
+
+def _dict_question(block):
+    """A question as parse_question returned it before QuestionRecord"""
+    record = parse_question(block)
+    if record is None:
+        return None
+    return {
+        'number': record.number,
+        'topic': str(record.topic) if record.topic is not None else None,
+        'content': record.content,
+        'options': list(record.options),
+        'correct': list(''.join(record.correct)),
+    }
+
+
+def _dict_quiz(question_data):
+    """The quiz dict /get_questions used to cache for every question"""
+    return {
+        'number': question_data['number'],
+        'topic': question_data['topic'],
+        'content': question_data['content'],
+        'options': clean_texts(question_data['options']),
+        'correctAnswers': [ord(ans) - ord('A') for ans in question_data['correct']],
+        'isMultiAnswer': len(question_data['correct']) > 1
+    }
+
+
+def _record_quiz(question_data):
+    options = tuple(clean_texts(question_data.options))
+    if options != question_data.options:
+        return question_data.replace(options=options)
+    return question_data
+
+
+def retained(build):
+    """Bytes still allocated once build() has returned, and its result"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def measure(blocks):
+    # Warm the cleaning memo so neither side is charged for it
+    for block in blocks:
+        record = parse_question(block)
+        if record is not None:
+            clean_texts(record.options)
+
+    dict_bytes, dicts = retained(lambda: [q for q in map(_dict_question, blocks) if q])
+    record_bytes, records = retained(lambda: [q for q in map(parse_question, blocks) if q])
+    dict_quiz_bytes, _ = retained(lambda: [_dict_quiz(q) for q in dicts])
+    record_quiz_bytes, _ = retained(lambda: [_record_quiz(q) for q in records])
+
+    count = len(records)
+    dict_total = dict_bytes + dict_quiz_bytes
+    record_total = record_bytes + record_quiz_bytes
+    return {
+        'questions': count,
+        'dict_bank_bytes_per_question': round(dict_bytes / count, 1),
+        'record_bank_bytes_per_question': round(record_bytes / count, 1),
+        'dict_quiz_bytes_per_question': round(dict_quiz_bytes / count, 1),
+        'record_quiz_bytes_per_question': round(record_quiz_bytes / count, 1),
+        'dict_total_bytes_per_question': round(dict_total / count, 1),
+        'record_total_bytes_per_question': round(record_total / count, 1),
+        'reduction_percent': round(100 * (1 - record_total / dict_total), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000',
+                        help='comma separated question counts to generate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='also write the results as JSON to this file')
+    parser.add_argument('--min-reduction', type=float,
+                        help='fail if the total footprint shrinks by less than this percentage')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(s) for s in args.sizes.split(',')):
+            dump_path = os.path.join(workdir, f'dump_{size}.txt')
+            write_dump(dump_path, size, seed=args.seed)
+            with open(dump_path, 'r', encoding='utf-8') as file:
+                blocks = [b for b in file.read().split(QUESTION_SEPARATOR) if b.strip()]
+            result = measure(blocks)
+            results.append(result)
+            print(
+                f"{result['questions']:>9} questions  "
+                f"dict {result['dict_total_bytes_per_question']:>8} B/q  "
+                f"record {result['record_total_bytes_per_question']:>8} B/q  "
+                f"-{result['reduction_percent']}%"
+            )
+
+    summary = {'benchmark': 'memory', 'results': results}
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(summary, file, indent=2)
+
+    if args.min_reduction is not None:
+        worst = min(result['reduction_percent'] for result in results)
+        if worst < args.min_reduction:
+            print(f'REGRESSION: footprint reduction {worst}% is below {args.min_reduction}%', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
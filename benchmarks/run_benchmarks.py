@@ -0,0 +1,300 @@
+"""Throughput and peak-memory benchmarks for the hot paths.
+
+For each requested bank size a synthetic dump is generated (see
+generate_dump.py) and these benchmarks run against it:
+
+    parse_question              every raw block of the dump
+    clean_special_characters    every raw option line, memo cleared
+    create_practice_document    and the other two create_* builders
+    render_merged               the answer key rendered in parallel chunks
+    render_split                the answer key as parallel part documents
+    get_questions               GET /get_questions through the test client
+    export_results              POST /export_results with one row per question
+
+Each benchmark is timed on its own, then repeated under tracemalloc for
+the peak Python allocation. Results are written as JSON and can be
+compared with an earlier run:
+
+    python benchmarks/run_benchmarks.py --sizes 1000,10000 -o bench.json
+    python benchmarks/run_benchmarks.py --sizes 1000,10000 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_dump import write_dump  # noqa: E402
+
+BENCHMARKS = (
+    'parse_question',
+    'clean_special_characters',
+    'create_practice_document',
+    'create_answer_key_document',
+    'create_snowpro_core_with_answers',
+    'render_merged',
+    'render_split',
+    'get_questions',
+    'export_results',
+)
+
+
+class Context:
+    """Per-size state shared by the benchmarks"""
+
+    def __init__(self, workdir, dump_path, size):
+        self.workdir = workdir
+        self.dump_path = dump_path
+        self.size = size
+        self._blocks = None
+        self._option_lines = None
+        self._results = None
+
+    @property
+    def blocks(self):
+        if self._blocks is None:
+            from question_parser import QUESTION_SEPARATOR
+            with open(self.dump_path, 'r', encoding='utf-8') as file:
+                self._blocks = [b for b in file.read().split(QUESTION_SEPARATOR) if b.strip()]
+        return self._blocks
+
+    @property
+    def option_lines(self):
+        if self._option_lines is None:
+            from question_parser import OPTION_LINE_RE
+            self._option_lines = [
+                line.strip() for block in self.blocks for line in block.split('\n')
+                if OPTION_LINE_RE.match(line.strip())
+            ]
+        return self._option_lines
+
+    @property
+    def results(self):
+        if self._results is None:
+            from question_bank import parse_question_file
+            self._results = [
+                {
+                    'Question Number': q['number'],
+                    'Question': q['content'],
+                    'Your Answers': q['options'][0],
+                    'Correct Answers': ', '.join(q['correct']),
+                }
+                for q in parse_question_file(self.dump_path)
+            ]
+        return self._results
+
+
+def _reset_caches():
+    from bank_merge import bank_merger
+    from question_bank import bank_cache
+    from question_parser import _clean_text
+    bank_cache.clear()
+    bank_merger.clear()
+    _clean_text.cache_clear()
+
+
+def bench_parse_question(ctx):
+    from question_parser import parse_question
+    blocks = ctx.blocks
+    return lambda: sum(1 for block in blocks if parse_question(block)), len(blocks)
+
+
+def bench_clean_special_characters(ctx):
+    from question_parser import clean_special_characters
+    lines = ctx.option_lines
+
+    def run():
+        _reset_caches()
+        for line in lines:
+            clean_special_characters(line)
+    return run, len(lines)
+
+
+def _bench_builder(name):
+    def bench(ctx):
+        import docx_generator
+        builder = getattr(docx_generator, name)
+        output = os.path.join(ctx.workdir, f'{name}.docx')
+
+        def run():
+            _reset_caches()
+            builder(ctx.dump_path, output)
+        return run, ctx.size
+    return bench
+
+
+def bench_render_merged(ctx):
+    from parallel_render import render_merged
+    from question_bank import parse_question_file
+    questions = parse_question_file(ctx.dump_path)
+    output = os.path.join(ctx.workdir, 'render_merged.docx')
+    return lambda: render_merged(questions, 'answers', output), ctx.size
+
+
+def bench_render_split(ctx):
+    from parallel_render import render_split
+    from question_bank import parse_question_file
+    questions = parse_question_file(ctx.dump_path)
+    output = os.path.join(ctx.workdir, 'render_split.docx')
+    return lambda: len(render_split(questions, 'answers', output)), ctx.size
+
+
+def bench_get_questions(ctx):
+    import app as app_module
+    client = app_module.app.test_client()
+
+    def run():
+        _reset_caches()
+        app_module._quiz_questions.cache_clear()
+        response = client.get('/get_questions')
+        assert response.status_code == 200, response.status_code
+        return len(response.data)
+    return run, ctx.size
+
+
+def bench_export_results(ctx):
+    import app as app_module
+    client = app_module.app.test_client()
+    payload = {'results': ctx.results}
+
+    def run():
+        response = client.post('/export_results', json=payload)
+        assert response.status_code == 200, response.status_code
+        return len(response.data)
+    return run, len(ctx.results)
+
+
+FACTORIES = {
+    'parse_question': bench_parse_question,
+    'clean_special_characters': bench_clean_special_characters,
+    'create_practice_document': _bench_builder('create_practice_document'),
+    'create_answer_key_document': _bench_builder('create_answer_key_document'),
+    'create_snowpro_core_with_answers': _bench_builder('create_snowpro_core_with_answers'),
+    'render_merged': bench_render_merged,
+    'render_split': bench_render_split,
+    'get_questions': bench_get_questions,
+    'export_results': bench_export_results,
+}
+
+
+def measure(name, ctx, memory=True):
+    run, items = FACTORIES[name](ctx)
+
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        run()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+    return {
+        'name': name,
+        'size': ctx.size,
+        'items': items,
+        'seconds': round(seconds, 6),
+        'items_per_second': round(items / seconds, 2) if seconds else None,
+        'mb_per_second': round(os.path.getsize(ctx.dump_path) / 1024 / 1024 / seconds, 3) if seconds else None,
+        'peak_mb': round(peak_mb, 3) if peak_mb is not None else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous):
+    """Print the throughput change of each benchmark against an earlier run"""
+    before = {(r['name'], r['size']): r for r in previous['results']}
+    print(f"\n{'benchmark':<36}{'size':>9}{'items/s':>14}{'change':>10}{'peak MB':>10}{'change':>10}")
+    for result in current['results']:
+        old = before.get((result['name'], result['size']))
+        speed = memory = ''
+        if old and old.get('items_per_second') and result['items_per_second']:
+            speed = f"{(result['items_per_second'] / old['items_per_second'] - 1) * 100:+.1f}%"
+        if old and old.get('peak_mb') and result['peak_mb']:
+            memory = f"{(result['peak_mb'] / old['peak_mb'] - 1) * 100:+.1f}%"
+        peak = f"{result['peak_mb']:.1f}" if result['peak_mb'] is not None else '-'
+        print(f"{result['name']:<36}{result['size']:>9}{result['items_per_second']:>14.1f}{speed:>10}{peak:>10}{memory:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths on synthetic dumps.')
+    parser.add_argument('--sizes', default='1000,10000',
+                        help='comma separated question counts (default: 1000,10000)')
+    parser.add_argument('--only', help='comma separated benchmark names to run')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in FACTORIES]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    output = os.path.abspath(args.output) if args.output else None
+    previous = os.path.abspath(args.compare) if args.compare else None
+
+    workdir = tempfile.mkdtemp(prefix='et-bench-')
+    # The app resolves its folders relative to the working directory
+    os.chdir(workdir)
+    import app as app_module
+    from question_bank import bank_cache
+    bank_cache.index_folder = None
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': [],
+    }
+
+    for size in sizes:
+        input_folder = os.path.join(workdir, f'inputs_{size}')
+        os.makedirs(input_folder, exist_ok=True)
+        dump_path = os.path.join(input_folder, f'bank_{size}.txt')
+        write_dump(dump_path, size, seed=args.seed)
+        app_module.INPUT_FOLDER = input_folder
+        ctx = Context(workdir, dump_path, size)
+
+        for name in names:
+            result = measure(name, ctx, memory=not args.no_memory)
+            report['results'].append(result)
+            peak = f"{result['peak_mb']:.1f} MB peak" if result['peak_mb'] is not None else ''
+            print(f"{name:<36}{size:>9}  {result['seconds']:>9.3f}s  "
+                  f"{result['items_per_second']:>12.1f} items/s  {peak}")
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if previous:
+        with open(previous) as file:
+            compare(report, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Cold-start benchmark for the Flask app.
+
+Each run starts a fresh interpreter, imports app, and serves the first
+/get_questions request through the test client. It records import time,
+time to the first response, resident memory and any heavy modules that
+got loaded on the way. Pass the --max-* limits to fail on regressions.
+
+    python benchmarks/startup.py --runs 5 --max-import-ms 600
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should only be loaded by the routes that need them
+HEAVY_MODULES = ('docx', 'lxml', 'openpyxl', 'pandas', 'requests', 'bs4')
+
+PROBE = r"""
+import json, sys, time
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+import_rss = rss_mb()
+heavy_at_import = [name for name in HEAVY if name in sys.modules]
+
+response = app.app.test_client().get('/get_questions')
+first = time.perf_counter()
+
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_response_ms': (first - start) * 1000,
+    'status': response.status_code,
+    'import_rss_mb': import_rss,
+    'rss_mb': rss_mb(),
+    'heavy_at_import': heavy_at_import,
+    'heavy_after_first_response': [name for name in HEAVY if name in sys.modules],
+}))
+"""
+
+
+def run_once():
+    code = f'HEAVY = {HEAVY_MODULES!r}\n{PROBE}'
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    # The app may print debug lines; the measurement is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', help='also write the summary as JSON to this file')
+    parser.add_argument('--max-import-ms', type=float)
+    parser.add_argument('--max-first-response-ms', type=float)
+    parser.add_argument('--max-rss-mb', type=float)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    summary = {
+        'benchmark': 'startup',
+        'runs': args.runs,
+        'import_ms_median': statistics.median(run['import_ms'] for run in runs),
+        'first_response_ms_median': statistics.median(run['first_response_ms'] for run in runs),
+        'import_rss_mb_median': statistics.median(run['import_rss_mb'] for run in runs),
+        'rss_mb_median': statistics.median(run['rss_mb'] for run in runs),
+        'heavy_at_import': sorted({name for run in runs for name in run['heavy_at_import']}),
+        'heavy_after_first_response': sorted({name for run in runs for name in run['heavy_after_first_response']}),
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(summary, file, indent=2)
+
+    failures = []
+    if summary['heavy_at_import']:
+        failures.append(f"heavy modules loaded at import: {', '.join(summary['heavy_at_import'])}")
+    if summary['heavy_after_first_response']:
+        failures.append(f"heavy modules loaded by /get_questions: {', '.join(summary['heavy_after_first_response'])}")
+    limits = [
+        ('import_ms_median', args.max_import_ms),
+        ('first_response_ms_median', args.max_first_response_ms),
+        ('rss_mb_median', args.max_rss_mb),
+    ]
+    for key, limit in limits:
+        if limit is not None and summary[key] > limit:
+            failures.append(f'{key} {summary[key]:.1f} exceeds {limit}')
+
+    for failure in failures:
+        print(f'REGRESSION: {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import metrics
+
+# Builds allowed to wait for a free worker, per worker, unless set explicitly
+DEFAULT_QUEUE_PER_WORKER = 2
+# Seconds a client is asked to wait after being turned away
+RETRY_AFTER_SECONDS = 5
+
+
+def pool_context():
+    """Start method for worker pools created after the server is running
+
+    Pools are created lazily, often from a request thread, and forking a
+    process that has other threads can copy locks they hold into the
+    child. Workers are forked from a single-threaded fork server instead
+    where the platform has one; elsewhere the default already spawns.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context()
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing a build when the executor is full"""
+
+    def __init__(self, in_flight, retry_after=RETRY_AFTER_SECONDS):
+        super().__init__(f'Too many builds in progress ({in_flight}); retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+class BuildExecutor:
+    """Bounded process pool for CPU-heavy builds, with admission control.
+
+    run() hands a build to a worker process and waits for its result, so
+    the request thread only sleeps and fast routes served by other threads
+    don't compete with it for the GIL. At most max_workers builds run at
+    once and max_queue more may wait; beyond that run() raises Overloaded
+    straight away instead of growing the backlog. With max_workers=0
+    builds run in the calling thread, still subject to the same limit.
+    """
+
+    def __init__(self, max_workers=None, max_queue=None):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self.max_workers = max_workers
+        if max_queue is None:
+            max_queue = DEFAULT_QUEUE_PER_WORKER * max(max_workers, 1)
+        self.max_queue = max_queue
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._in_flight = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return max(self.max_workers, 1) + self.max_queue
+
+    def _get_executor(self):
+        # Created on first use so importing the app doesn't fork workers
+        if self._executor is None or getattr(self._executor, '_broken', False):
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=pool_context())
+        return self._executor
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self.rejected += 1
+                in_flight = self._in_flight
+            else:
+                self._in_flight += 1
+                in_flight = None
+        if in_flight is not None:
+            metrics.registry.inc(
+                'et_builds_rejected_total', help_text='Builds turned away because the executor was full',
+                route=metrics.current_route.get()
+            )
+            raise Overloaded(in_flight)
+
+    def _release(self, failed):
+        with self._lock:
+            self._in_flight -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in a worker and return its result
+
+        fn and its arguments must be picklable unless max_workers is 0.
+        Stage timings and counts recorded by fn in the worker are recorded
+        here, under the calling route.
+        """
+        self._admit()
+        failed = True
+        try:
+            if self.max_workers == 0:
+                result = fn(*args, **kwargs)
+            else:
+                with self._lock:
+                    executor = self._get_executor()
+                result, records = executor.submit(metrics.collect_call, fn, *args, **kwargs).result()
+                metrics.replay(records)
+            failed = False
+            return result
+        finally:
+            self._release(failed)
+
+    def map(self, fn, *iterables):
+        """Run fn over iterables on the workers as a single build
+
+        Admission is decided straight away; results are yielded in order
+        and the build counts as in flight until they have all been read.
+        Metrics are recorded as for run(), in the thread reading the results.
+        """
+        self._admit()
+        return self._map(fn, iterables)
+
+    def _map(self, fn, iterables):
+        failed = True
+        try:
+            if self.max_workers == 0:
+                yield from map(fn, *iterables)
+            else:
+                with self._lock:
+                    executor = self._get_executor()
+                for result, records in executor.map(metrics.collect_call, repeat(fn), *iterables):
+                    metrics.replay(records)
+                    yield result
+            failed = False
+        finally:
+            self._release(failed)
+
+    def stats(self):
+        with self._lock:
+            workers = max(self.max_workers, 1)
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'running': min(self._in_flight, workers),
+                'queued': max(self._in_flight - workers, 0),
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -0,0 +1,256 @@
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+from docx_generator import GENERATOR_VERSION
+from parallel_render import (
+    DEFAULT_CHUNK_SIZE, chunk_ranges, part_path, render_document, render_split, renders_in_parallel
+)
+from question_bank import bank_cache
+
+# Eviction defaults for the generated document cache
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+
+
+def _render_bytes(questions, kind, **options):
+    buffer = BytesIO()
+    render_document(questions, kind, buffer, **options)
+    return buffer.getvalue()
+
+
+class DocumentCache:
+    """Content-addressed cache of generated .docx files.
+
+    Documents are keyed as <kind>_<input hash>_v<generator version>.docx,
+    so a changed input or generator never matches an old entry. The input
+    is either a bank path or a MergedBank, keyed by its fingerprint. With a
+    folder the documents are files on disk; with folder=None they are kept
+    in memory and nothing is written. A bank can also be cached as split
+    part documents, on disk only. Entries are evicted once they are
+    older than max_age seconds (since last use) or when the cache grows
+    past max_bytes, oldest first. With an executor (a BuildExecutor) misses
+    are rendered through it instead of in the calling thread, and large
+    banks are split over its workers; render_workers is then only used if
+    it has none.
+    """
+
+    def __init__(self, folder, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE, render_workers=None,
+                 executor=None):
+        self.folder = folder
+        # Worker processes for rendering large banks without an executor; 1 always renders serially
+        self.render_workers = render_workers
+        self.executor = executor
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        # name -> (last used, bytes) when running without a folder
+        self._memory = OrderedDict()
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def name_for(self, input_path, kind):
+        if isinstance(input_path, str):
+            fingerprint = bank_cache.fingerprint(input_path)
+        else:
+            fingerprint = input_path.fingerprint
+        return f'{kind}_{fingerprint}_v{GENERATOR_VERSION}.docx'
+
+    def get(self, input_path, kind):
+        """Return the path of the document for input_path, building it on a miss"""
+        if not self.folder:
+            raise RuntimeError('Document cache has no folder; use get_bytes()')
+        return self._get(input_path, kind)
+
+    def get_bytes(self, input_path, kind):
+        """Return the document for input_path as bytes, building it on a miss"""
+        result = self._get(input_path, kind)
+        if self.folder:
+            with open(result, 'rb') as file:
+                return file.read()
+        return result
+
+    def get_parts(self, input_path, kind, part_size=DEFAULT_CHUNK_SIZE):
+        """Return the paths of the part documents for input_path, building them on a miss
+
+        Each part holds part_size consecutive questions, in bank order,
+        and is cached as <document name>_split<part_size>_part<n>.docx.
+        """
+        if not self.folder:
+            raise RuntimeError('Document cache has no folder; split documents are only kept on disk')
+        questions = self._questions(input_path)
+        base = self.name_for(input_path, kind).replace('.docx', f'_split{part_size}.docx')
+        names = [part_path(base, index) for index in range(1, len(chunk_ranges(len(questions), part_size)) + 1)]
+
+        def lookup():
+            paths = [self._lookup(name) for name in names]
+            return None if None in paths else paths
+
+        return self._cached(base, names, lookup, lambda: self._build_parts(questions, kind, base, part_size))
+
+    def _get(self, input_path, kind):
+        name = self.name_for(input_path, kind)
+        return self._cached(
+            name, [name], lambda: self._lookup(name), lambda: self._build(self._questions(input_path), kind, name)
+        )
+
+    def _cached(self, key, names, lookup, build):
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # Only one thread builds a given document; the others wait and reuse it
+        with build_lock:
+            cached = lookup()
+            if cached is not None:
+                with self._lock:
+                    self.hits += 1
+                return cached
+
+            try:
+                result = build()
+            finally:
+                with self._lock:
+                    self._build_locks.pop(key, None)
+
+        with self._lock:
+            self.misses += 1
+        self.evict(keep=names)
+        return result
+
+    def _lookup(self, name):
+        if self.folder:
+            path = os.path.join(self.folder, name)
+            if not os.path.exists(path):
+                return None
+            os.utime(path)
+            return path
+
+        with self._lock:
+            entry = self._memory.get(name)
+            if entry is None:
+                return None
+            self._memory[name] = (time.time(), entry[1])
+            self._memory.move_to_end(name)
+            return entry[1]
+
+    @staticmethod
+    def _questions(input_path):
+        if isinstance(input_path, str):
+            return bank_cache.get(input_path)
+        return input_path.questions
+
+    def _build(self, questions, kind, name):
+        if not self.folder:
+            data = self._render(_render_bytes, questions, kind)
+            with self._lock:
+                self._memory[name] = (time.time(), data)
+            return data
+
+        path = os.path.join(self.folder, name)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            self._render(render_document, questions, kind, temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return path
+
+    def _render(self, render, questions, *args):
+        if self.executor is None:
+            return render(questions, *args, workers=self.render_workers)
+        if self.executor.max_workers == 0:
+            # Builds run in this thread, so the render pool is this process's own
+            return self.executor.run(render, questions, *args, workers=self.render_workers)
+        if renders_in_parallel(len(questions), max(self.executor.max_workers, 1)):
+            # Chunks are handed to the build workers from here; a pool started
+            # inside a build worker would escape the executor's limits
+            return render(questions, *args, executor=self.executor)
+        # Only the question list is sent to the worker, not a whole MergedBank
+        return self.executor.run(render, list(questions), *args, workers=1)
+
+    def _build_parts(self, questions, kind, base, part_size):
+        # Parts are written to a private folder, then moved into the cache
+        temp_folder = os.path.join(self.folder, f'{base}.{os.getpid()}.{threading.get_ident()}.tmp')
+        os.makedirs(temp_folder, exist_ok=True)
+        try:
+            target = os.path.join(temp_folder, base)
+            if self.executor is None:
+                parts = render_split(questions, kind, target, chunk_size=part_size, workers=self.render_workers)
+            elif self.executor.max_workers == 0:
+                parts = self.executor.run(
+                    render_split, questions, kind, target, chunk_size=part_size, workers=self.render_workers
+                )
+            else:
+                # Each part is a task on the build workers, admitted as one build
+                parts = render_split(questions, kind, target, chunk_size=part_size, executor=self.executor)
+            paths = []
+            for part in parts:
+                path = os.path.join(self.folder, os.path.basename(part))
+                os.replace(part, path)
+                paths.append(path)
+            return paths
+        finally:
+            shutil.rmtree(temp_folder, ignore_errors=True)
+
+    def evict(self, keep=()):
+        """Drop expired documents, then the oldest ones until under max_bytes
+
+        keep names documents to leave in place.
+        """
+        if not self.folder:
+            self._evict_memory(keep)
+            return
+
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith('.docx'):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name not in keep and now - stat.st_mtime > self.max_age:
+                self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name in keep:
+                continue
+            self._remove(os.path.join(self.folder, name))
+            total -= size
+
+    def _evict_memory(self, keep):
+        now = time.time()
+        with self._lock:
+            # Entries are kept in least recently used order
+            total = sum(len(data) for _, data in self._memory.values())
+            for name, (used, data) in list(self._memory.items()):
+                if name in keep:
+                    continue
+                if now - used > self.max_age or total > self.max_bytes:
+                    del self._memory[name]
+                    total -= len(data)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,355 @@
+"""Direct WordprocessingML writer for the question documents.
+
+Documents are written as XML straight into the zip package instead of
+through python-docx objects. All package parts other than the document
+body come from python-docx's default template, so the result opens and
+looks the same as a python-docx document. Paragraph formatting lives in
+a few shared styles added to styles.xml rather than on every paragraph.
+"""
+import importlib.util
+import os
+import re
+import struct
+import threading
+import zipfile
+import zlib
+
+DOCUMENT_PART = 'word/document.xml'
+STYLES_PART = 'word/styles.xml'
+
+# Shared styles referenced by the generated paragraphs
+QUESTION_TITLE_STYLE = 'QuestionTitle'
+SNOWPRO_TEXT_STYLE = 'SnowproText'
+SNOWPRO_TITLE_STYLE = 'SnowproQuestionTitle'
+
+# Formatting of each Snowpro paragraph:
+# exact 15pt line spacing (300 twips) and no space before or after
+EXTRA_STYLES = (
+    f'<w:style w:type="paragraph" w:customStyle="1" w:styleId="{QUESTION_TITLE_STYLE}">'
+    '<w:name w:val="Question Title"/><w:basedOn w:val="Normal"/><w:qFormat/>'
+    '<w:rPr><w:b/></w:rPr></w:style>'
+    f'<w:style w:type="paragraph" w:customStyle="1" w:styleId="{SNOWPRO_TEXT_STYLE}">'
+    '<w:name w:val="Snowpro Text"/><w:basedOn w:val="Normal"/><w:qFormat/>'
+    '<w:pPr><w:spacing w:before="0" w:after="0" w:line="300" w:lineRule="exact"/></w:pPr></w:style>'
+    f'<w:style w:type="paragraph" w:customStyle="1" w:styleId="{SNOWPRO_TITLE_STYLE}">'
+    f'<w:name w:val="Snowpro Question Title"/><w:basedOn w:val="{SNOWPRO_TEXT_STYLE}"/><w:qFormat/>'
+    '<w:rPr><w:b/></w:rPr></w:style>'
+)
+
+# Characters XML 1.0 cannot represent; python-docx rejects them outright
+INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+# Tabs and line breaks become run elements, like python-docx's run.text
+RUN_SPLIT_RE = re.compile(r'(\t|\r\n?|\n)')
+
+# Whitespace between tags that only indents the template XML
+INDENT_RE = re.compile(rb'>\s*\n\s*<')
+
+EMPTY_PARAGRAPH = '<w:p/>'
+
+# Fixed timestamp for the document part, like the template parts carry
+DOCUMENT_DATE_TIME = (2019, 1, 8, 23, 2, 8)
+
+# zlib's default level, as zipfile uses
+COMPRESS_LEVEL = 6
+
+# Zip record layouts (see zipfile's structFileHeader and friends)
+LOCAL_HEADER = '<4s2B4HL2L2H'
+CENTRAL_HEADER = '<4s4B4HL2L5H2L'
+END_RECORD = '<4s4H2LH'
+ZIP_VERSION = 20
+ZIP_MAX_SIZE = 0xFFFFFFFF
+
+_base_lock = threading.Lock()
+_base = None
+
+
+def _template_path():
+    # Located without importing python-docx, which is slow to import
+    spec = importlib.util.find_spec('docx')
+    return os.path.join(os.path.dirname(spec.origin), 'templates', 'default.docx')
+
+
+def deflate(data, mode=zlib.Z_SYNC_FLUSH):
+    """Raw-deflate bytes, ending byte-aligned so pieces can be concatenated"""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(mode)
+
+
+def deflate_piece(xml):
+    """Compress a run of body XML for DocxWriter.add_deflated
+
+    Returns (deflated bytes, crc32, uncompressed length); used by workers
+    that render part of a document.
+    """
+    data = xml.encode('utf-8')
+    return deflate(data), zlib.crc32(data), len(data)
+
+
+def _gf2_times(matrix, vector):
+    total = 0
+    index = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[index]
+        vector >>= 1
+        index += 1
+    return total
+
+
+def _gf2_square(matrix):
+    return [_gf2_times(matrix, row) for row in matrix]
+
+
+def crc32_combine(crc1, crc2, length2):
+    """CRC-32 of A + B from crc32(A), crc32(B) and len(B), as in zlib"""
+    if length2 <= 0:
+        return crc1
+    # Operator for one zero bit, then squared up to two and four bits
+    odd = [0xEDB88320] + [1 << n for n in range(31)]
+    even = _gf2_square(odd)
+    odd = _gf2_square(even)
+    while True:
+        even = _gf2_square(odd)
+        if length2 & 1:
+            crc1 = _gf2_times(even, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+        odd = _gf2_square(even)
+        if length2 & 1:
+            crc1 = _gf2_times(odd, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+    return crc1 ^ crc2
+
+
+def _base_package():
+    """Return (template parts, body head, body tail)
+
+    Parts are (name, date_time, deflated bytes, crc32, size) for every
+    template part except the body. They are compressed once per process
+    and keep the template's timestamps, so the same questions always
+    produce the same bytes.
+    """
+    global _base
+    with _base_lock:
+        if _base is None:
+            parts = []
+            with zipfile.ZipFile(_template_path()) as template:
+                for info in template.infolist():
+                    data = template.read(info.filename)
+                    if info.filename == DOCUMENT_PART:
+                        document = data.decode('utf-8')
+                        continue
+                    if info.filename.endswith(('.xml', '.rels')):
+                        # Drop the template's indentation, as python-docx does on save
+                        data = INDENT_RE.sub(b'><', data)
+                    if info.filename == STYLES_PART:
+                        data = data.replace(b'</w:styles>', EXTRA_STYLES.encode('utf-8') + b'</w:styles>')
+                    parts.append((info.filename, info.date_time, deflate(data, zlib.Z_FINISH), zlib.crc32(data), len(data)))
+
+            # Paragraphs go at the start of the body, before its sectPr
+            body = document.index('<w:body>') + len('<w:body>')
+            head = document[:body].encode('utf-8')
+            tail = re.sub(r'>\s+<', '><', document[body:].strip()).encode('utf-8')
+            _base = (parts, head, tail)
+        return _base
+
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _text_element(text):
+    if text.strip() != text:
+        return f'<w:t xml:space="preserve">{_escape(text)}</w:t>'
+    return f'<w:t>{_escape(text)}</w:t>'
+
+
+def run_xml(text):
+    """Return the content of a run holding text"""
+    text = INVALID_XML_RE.sub('', text)
+    if '\t' not in text and '\n' not in text and '\r' not in text:
+        return _text_element(text) if text else ''
+    parts = []
+    for piece in RUN_SPLIT_RE.split(text):
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\n', '\r', '\r\n'):
+            # python-docx writes one break per character, so '\r\n' is two
+            parts.append('<w:br/>' * len(piece))
+        elif piece:
+            parts.append(_text_element(piece))
+    return ''.join(parts)
+
+
+def paragraph_xml(text, style=None):
+    """Return a paragraph with an optional style and a single run of text"""
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    content = run_xml(text) if text else ''
+    run = f'<w:r>{content}</w:r>' if content else ''
+    if not properties and not run:
+        return EMPTY_PARAGRAPH
+    return f'<w:p>{properties}{run}</w:p>'
+
+
+def plain_question_xml(number, content, options, answer_line):
+    """Paragraphs of a practice or answer key question, spacer included"""
+    paragraphs = [paragraph_xml(f'Question {number}', QUESTION_TITLE_STYLE), paragraph_xml(content)]
+    paragraphs.extend(paragraph_xml(option) for option in options)
+    if answer_line is not None:
+        paragraphs.append(paragraph_xml(answer_line))
+    paragraphs.append(EMPTY_PARAGRAPH)
+    return ''.join(paragraphs)
+
+
+def snowpro_question_xml(number, content, options, answer_line):
+    """Paragraphs of a Snowpro Core formatted question, spacer included"""
+    paragraphs = [
+        paragraph_xml(f'Question {number}', SNOWPRO_TITLE_STYLE),
+        paragraph_xml(content, SNOWPRO_TEXT_STYLE),
+    ]
+    paragraphs.extend(paragraph_xml(option, SNOWPRO_TEXT_STYLE) for option in options)
+    paragraphs.append(paragraph_xml(answer_line, SNOWPRO_TEXT_STYLE))
+    paragraphs.append(EMPTY_PARAGRAPH)
+    return ''.join(paragraphs)
+
+
+class DocxWriter:
+    """Streams question paragraphs into a .docx package.
+
+    target is a path or a seekable binary file object. Use as a context
+    manager, call add() with paragraph XML (or add_deflated() with pieces
+    from deflate_piece), and the package is finished on exit. The body is
+    compressed as it is written, so the whole document is never held in
+    memory. The zip container is written here rather than by zipfile so
+    that pieces compressed elsewhere can be spliced in unchanged.
+    """
+
+    # Paragraph XML buffered before each compression call
+    FLUSH_CHARS = 256 * 1024
+
+    def __init__(self, target):
+        self.target = target
+        self._file = None
+        self._stream = None
+        self._entries = []
+        self._tail = None
+        self._pending = []
+        self._pending_chars = 0
+        self._compressor = None
+        self._crc = 0
+        self._size = 0
+        self._compressed = 0
+        self._header_offset = None
+
+    def __enter__(self):
+        parts, head, self._tail = _base_package()
+        if isinstance(self.target, str):
+            self._file = open(self.target, 'w+b')
+            self._stream = self._file
+        else:
+            self._stream = self.target
+        try:
+            for name, date_time, data, crc, size in parts:
+                self._write_entry(name, date_time, data, crc, size)
+            # The body's CRC and sizes are filled in once it is complete
+            self._header_offset = self._write_entry(DOCUMENT_PART, DOCUMENT_DATE_TIME, b'', 0, 0)
+            self._compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+            self._write_body(head)
+        except BaseException:
+            self._close_file()
+            raise
+        return self
+
+    def _write_entry(self, name, date_time, data, crc, size):
+        offset = self._stream.tell()
+        time, date = _dos_time(date_time)
+        encoded = name.encode('utf-8')
+        self._stream.write(struct.pack(
+            LOCAL_HEADER, b'PK\x03\x04', ZIP_VERSION, 0, 0, zipfile.ZIP_DEFLATED,
+            time, date, crc, len(data), size, len(encoded), 0
+        ))
+        self._stream.write(encoded)
+        self._stream.write(data)
+        self._entries.append([encoded, time, date, crc, len(data), size, offset])
+        return offset
+
+    def _write_body(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._write_compressed(self._compressor.compress(data))
+
+    def _write_compressed(self, data):
+        self._compressed += len(data)
+        self._stream.write(data)
+
+    def add(self, xml):
+        self._pending.append(xml)
+        self._pending_chars += len(xml)
+        if self._pending_chars >= self.FLUSH_CHARS:
+            self._flush()
+
+    def add_deflated(self, piece):
+        """Append body XML already compressed by deflate_piece"""
+        data, crc, size = piece
+        self._flush()
+        # End the current deflate stream on a byte boundary; the piece and
+        # the XML after it start fresh, so back-references stay valid
+        self._write_compressed(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+        self._write_compressed(data)
+        self._crc = crc32_combine(self._crc, crc, size)
+        self._size += size
+        self._compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def _flush(self):
+        if self._pending:
+            self._write_body(''.join(self._pending).encode('utf-8'))
+            self._pending = []
+            self._pending_chars = 0
+
+    def _finish(self):
+        self._flush()
+        self._write_body(self._tail)
+        self._write_compressed(self._compressor.flush(zlib.Z_FINISH))
+        if max(self._size, self._compressed, self._stream.tell()) > ZIP_MAX_SIZE:
+            raise ValueError('Document too large for a zip without zip64 extensions')
+
+        end = self._stream.tell()
+        self._stream.seek(self._header_offset + 14)
+        self._stream.write(struct.pack('<3L', self._crc, self._compressed, self._size))
+        self._stream.seek(end)
+        body_entry = self._entries[-1]
+        body_entry[3:6] = [self._crc, self._compressed, self._size]
+
+        directory_offset = end
+        for encoded, time, date, crc, compressed, size, offset in self._entries:
+            self._stream.write(struct.pack(
+                CENTRAL_HEADER, b'PK\x01\x02', ZIP_VERSION, 0, ZIP_VERSION, 0, 0, zipfile.ZIP_DEFLATED,
+                time, date, crc, compressed, size, len(encoded), 0, 0, 0, 0, 0o600 << 16, offset
+            ))
+            self._stream.write(encoded)
+        directory_size = self._stream.tell() - directory_offset
+        self._stream.write(struct.pack(
+            END_RECORD, b'PK\x05\x06', 0, 0, len(self._entries), len(self._entries),
+            directory_size, directory_offset, 0
+        ))
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                self._finish()
+        finally:
+            self._close_file()
+        return False
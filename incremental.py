@@ -0,0 +1,254 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from docx_generator import GENERATOR_VERSION, build_outputs
+from question_bank import file_fingerprint
+from question_parser import iter_question_blocks, parse_question
+from question_record import QuestionRecord
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the manifest layout or the parsed record format changes
+MANIFEST_VERSION = 2
+
+# Manifest entry of the document rendered from all banks merged
+MERGED_ENTRY = 'merged'
+
+# Seconds between polls of the inputs folder in watch mode
+DEFAULT_WATCH_INTERVAL = 2.0
+
+
+def block_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def output_stats(outputs):
+    """[size, mtime_ns] of each output file, or None where it is missing"""
+    stats = []
+    for _, target in outputs:
+        try:
+            stat = os.stat(target)
+        except OSError:
+            stats.append(None)
+        else:
+            stats.append([stat.st_size, stat.st_mtime_ns])
+    return stats
+
+
+class Manifest:
+    """Per-output-set records of what was last processed, one JSON file each.
+
+    An entry holds the input's size, mtime and sha256, and the outputs
+    written from it with their size and mtime once written, so an output
+    since overwritten by another route no longer counts as current. For
+    bank files the hash and parsed form of every raw question block are
+    kept in a separate <name>.blocks.json, read only when reprocessing.
+    Entries are separate files so worker processes can update them
+    concurrently.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def path_for(self, name):
+        return os.path.join(self.folder, f'{name}.json')
+
+    def blocks_path_for(self, name):
+        return os.path.join(self.folder, f'{name}.blocks.json')
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != MANIFEST_VERSION or data.get('generator') != GENERATOR_VERSION:
+            return None
+        return data
+
+    def _write(self, path, data):
+        data = dict(data, version=MANIFEST_VERSION, generator=GENERATOR_VERSION)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(data, file)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def load(self, name):
+        return self._read(self.path_for(name))
+
+    def load_blocks(self, name):
+        """Return the block hash -> parsed question map last saved for name"""
+        data = self._read(self.blocks_path_for(name))
+        return data['blocks'] if data else {}
+
+    def save(self, name, entry, blocks=None):
+        """Record entry for name, after its outputs have been written"""
+        if blocks is not None:
+            self._write(self.blocks_path_for(name), {'blocks': blocks})
+        outputs = [tuple(output) for output in entry['outputs']]
+        self._write(self.path_for(name), dict(entry, written=output_stats(outputs)))
+
+    def is_current(self, name, source, outputs):
+        """True if name was last processed from source into exactly these outputs
+
+        source is a dict identifying the input; for files only size and
+        mtime are compared first, the content hash only when they differ.
+        Outputs must still have the size and mtime recorded when written.
+        """
+        entry = self.load(name)
+        if entry is None or entry['outputs'] != [list(output) for output in outputs]:
+            return False
+        stats = output_stats(outputs)
+        if None in stats or entry.get('written') != stats:
+            return False
+
+        recorded = entry['source']
+        if 'path' not in source:
+            return recorded == source
+        try:
+            stat = os.stat(source['path'])
+        except OSError:
+            return False
+        if recorded.get('size') == stat.st_size and recorded.get('mtime_ns') == stat.st_mtime_ns:
+            return True
+        # Touched but possibly unchanged: fall back to the content hash
+        size, _, digest = file_fingerprint(source['path'])
+        return recorded.get('size') == size and recorded.get('sha256') == digest
+
+
+def file_source(path):
+    return {'path': path}
+
+
+def merged_source(merged):
+    return {'merge': merged.fingerprint}
+
+
+def parse_changed_blocks(path, previous):
+    """Parse a bank, reusing the parsed form of blocks seen last time
+
+    previous maps block hash -> parsed question (or None for blocks that
+    did not parse). Returns the questions, the new hash map and how many
+    blocks were parsed and reused.
+    """
+    questions = []
+    blocks = {}
+    parsed = reused = 0
+
+    with open(path, 'rb') as file:
+        for question_text in iter_question_blocks(file):
+            if not question_text.strip():
+                continue
+            key = block_hash(question_text)
+            if key in blocks:
+                question_data = blocks[key]
+                reused += 1
+            elif key in previous:
+                question_data = previous[key]
+                reused += 1
+            else:
+                question_data = parse_question(question_text)
+                parsed += 1
+            blocks[key] = question_data
+            if question_data:
+                questions.append(question_data)
+
+    return questions, blocks, parsed, reused
+
+
+def process_file(path, outputs, manifest_folder):
+    """Render outputs for one bank, re-parsing only blocks that changed
+
+    Runs inside a job worker. Returns the parsed and reused block counts.
+    """
+    manifest = Manifest(manifest_folder)
+    name = os.path.basename(path)
+    previous = {
+        key: QuestionRecord.from_mapping(question_data) if question_data else None
+        for key, question_data in manifest.load_blocks(name).items()
+    }
+
+    # Fingerprint first, so an edit made while parsing shows up next run
+    size, mtime_ns, digest = file_fingerprint(path)
+    questions, blocks, parsed, reused = parse_changed_blocks(path, previous)
+    build_outputs(questions, outputs)
+
+    manifest.save(name, {
+        'source': {'size': size, 'mtime_ns': mtime_ns, 'sha256': digest},
+        'outputs': [list(output) for output in outputs],
+    }, blocks={
+        key: question_data.to_dict() if question_data else None
+        for key, question_data in blocks.items()
+    })
+    return {'parsed': parsed, 'reused': reused}
+
+
+def process_merged(merged, outputs, manifest_folder):
+    """Render outputs for a MergedBank and record its fingerprint"""
+    build_outputs(merged.questions, outputs)
+    Manifest(manifest_folder).save(MERGED_ENTRY, {
+        'source': merged_source(merged),
+        'outputs': [list(output) for output in outputs],
+    })
+
+
+class InputWatcher:
+    """Polls a folder and calls on_change once new or edited .txt files settle.
+
+    A change is reported only after the listing (names, sizes, mtimes) has
+    stayed the same for one more poll, so files still being written are
+    not processed half-way.
+    """
+
+    def __init__(self, folder, on_change, interval=DEFAULT_WATCH_INTERVAL):
+        self.folder = folder
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def snapshot(self):
+        listing = {}
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.txt') and entry.is_file():
+                        stat = entry.stat()
+                        listing[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass
+        return listing
+
+    def _run(self):
+        processed = None
+        previous = self.snapshot()
+        while not self._stop.wait(self.interval):
+            current = self.snapshot()
+            if current == previous and current != processed:
+                try:
+                    self.on_change()
+                except Exception as e:
+                    # Keep watching; the next change retries
+                    logger.error(f"Error processing changed inputs: {str(e)}")
+                processed = current
+            previous = current
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='input-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import metrics
+from bank_merge import MergedBank
+from build_executor import pool_context
+from docx_generator import build_outputs
+from incremental import process_file, process_merged
+from question_bank import load_questions
+
+# Finished jobs kept around so clients can still read their results
+MAX_FINISHED_JOBS = 100
+
+
+def run_file_task(input_path, outputs, manifest_folder=None):
+    """Render the outputs for one input file; runs inside a worker process
+
+    input_path may also be a MergedBank. With a manifest folder, bank
+    files are processed incrementally and the manifest is updated.
+    Returns the elapsed seconds and any per-file details.
+    """
+    start = time.perf_counter()
+    details = None
+    if isinstance(input_path, MergedBank):
+        if manifest_folder:
+            process_merged(input_path, outputs, manifest_folder)
+        else:
+            build_outputs(input_path.questions, outputs)
+    elif manifest_folder:
+        details = process_file(input_path, outputs, manifest_folder)
+    else:
+        build_outputs(load_questions(input_path), outputs)
+    return time.perf_counter() - start, details
+
+
+def run_scrape_task(url, output_file, cache_folder):
+    """Scrape url into output_file; runs inside a worker process
+
+    Returns the elapsed seconds and the question count and fetch stats.
+    """
+    # requests and BeautifulSoup are only loaded when scraping
+    from scraper import Scraper
+
+    start = time.perf_counter()
+    scraper = Scraper(cache_folder)
+    try:
+        count = scraper.scrape_to_file(url, output_file)
+    finally:
+        scraper.close()
+    return time.perf_counter() - start, dict(scraper.stats, questions=count, output=output_file)
+
+
+def _task_name(input_path):
+    if isinstance(input_path, MergedBank):
+        return f'merged:{len(input_path.sources)} banks'
+    return input_path
+
+
+def _file_signature(path):
+    """Identify a specific version of an input file for deduplication"""
+    if isinstance(path, MergedBank):
+        return 'merged', path.fingerprint, None
+    try:
+        stat = os.stat(path)
+        return path, stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return path, None, None
+
+
+class JobManager:
+    """Runs file jobs on a process pool, one input file per task.
+
+    A job is a list of (input_path, outputs) tasks, as accepted by
+    build_outputs, or a single call queued with submit_call. Submitting a
+    job identical to one still in flight returns the existing job id
+    instead of starting new work. Metrics recorded by a task in its worker
+    are recorded here when it finishes, under the route that submitted it.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use so importing the app doesn't fork workers
+        if self._executor is None or getattr(self._executor, '_broken', False):
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=pool_context())
+        return self._executor
+
+    def submit(self, kind, tasks, manifest_folder=None):
+        """Queue a job and return its id"""
+        key = (kind, manifest_folder, tuple(
+            (_file_signature(input_path), tuple(outputs)) for input_path, outputs in tasks
+        ))
+        calls = [
+            (_task_name(input_path), run_file_task, (input_path, outputs, manifest_folder))
+            for input_path, outputs in tasks
+        ]
+        return self._submit(kind, key, calls)
+
+    def submit_call(self, kind, name, fn, *args):
+        """Queue a one-task job running fn(*args) in a worker and return its id
+
+        fn must be picklable and return (seconds, details dict or None).
+        """
+        return self._submit(kind, (kind, name, args), [(name, fn, args)])
+
+    def _submit(self, kind, key, calls):
+        with self._lock:
+            job_id = self._in_flight.get(key)
+            if job_id is not None:
+                return job_id
+
+            job_id = uuid.uuid4().hex
+            route = metrics.current_route.get()
+            job = {
+                'id': job_id,
+                'kind': kind,
+                'status': 'queued',
+                'created': time.time(),
+                'finished': None,
+                'total': len(calls),
+                'completed': 0,
+                'failed': 0,
+                'files': [
+                    {'file': name, 'status': 'queued', 'seconds': None, 'error': None}
+                    for name, _, _ in calls
+                ],
+            }
+            self._jobs[job_id] = job
+            self._in_flight[key] = job_id
+
+            if not calls:
+                self._finish(job, key)
+                return job_id
+
+            job['status'] = 'running'
+            executor = self._get_executor()
+
+        # Callbacks take the lock, and may run immediately in this thread
+        for index, (_, fn, args) in enumerate(calls):
+            try:
+                future = executor.submit(metrics.collect_call, fn, *args)
+            except Exception as e:
+                # A broken pool fails the task rather than the request
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(
+                lambda future, index=index: self._task_done(job, key, index, future, route)
+            )
+        return job_id
+
+    def _task_done(self, job, key, index, future, route):
+        error = future.exception()
+        if error is None:
+            (seconds, details), records = future.result()
+            metrics.replay(records, route)
+        with self._lock:
+            entry = job['files'][index]
+            if error is None:
+                entry['status'] = 'done'
+                entry['seconds'] = round(seconds, 4)
+                if details:
+                    entry.update(details)
+                job['completed'] += 1
+            else:
+                entry['status'] = 'error'
+                entry['error'] = str(error)
+                job['failed'] += 1
+
+            if job['completed'] + job['failed'] == job['total']:
+                self._finish(job, key)
+
+    def _finish(self, job, key):
+        # Caller holds the lock
+        job['status'] = 'error' if job['failed'] else 'done'
+        job['finished'] = time.time()
+        self._in_flight.pop(key, None)
+
+        finished = [job_id for job_id, item in self._jobs.items() if item['finished']]
+        for job_id in finished[:-MAX_FINISHED_JOBS]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Return a snapshot of a job, or None if it is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+            snapshot['files'] = [dict(entry) for entry in job['files']]
+            return snapshot
+
+    def list(self):
+        with self._lock:
+            return [
+                {key: job[key] for key in ('id', 'kind', 'status', 'total', 'completed', 'failed')}
+                for job in self._jobs.values()
+            ]
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
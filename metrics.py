@@ -0,0 +1,198 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Route label for work done outside a request (jobs, scripts)
+NO_ROUTE = 'none'
+
+current_route = contextvars.ContextVar('current_route', default=NO_ROUTE)
+# A list while collect_call() runs; records then go there instead of the registry
+_collected = contextvars.ContextVar('collected', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms rendered in Prometheus text format"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._help = {}
+        self._types = {}
+        self._counters = {}
+        self._histograms = {}
+        self._gauge_callbacks = []
+        self._lock = threading.Lock()
+
+    def _declare(self, name, kind, help_text):
+        self._types.setdefault(name, kind)
+        if help_text:
+            self._help.setdefault(name, help_text)
+
+    def inc(self, name, amount=1, help_text=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._declare(name, 'counter', help_text)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, help_text=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._declare(name, 'histogram', help_text)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = histogram[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    def register_gauges(self, callback):
+        """Add a callable returning [(name, help, labels dict, value)] read at render time"""
+        self._gauge_callbacks.append(callback)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, ([*value[0]], value[1], value[2])) for key, value in self._histograms.items()
+            )
+            types = dict(self._types)
+            helps = dict(self._help)
+
+        def header(name, kind, help_text):
+            if help_text:
+                lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        last = None
+        for (name, labels), value in counters:
+            if name != last:
+                header(name, types[name], helps.get(name))
+                last = name
+            lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+
+        for (name, labels), (counts, total, count) in histograms:
+            if name != last:
+                header(name, types[name], helps.get(name))
+                last = name
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (('le', _format_number(float(bound))),)
+                lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        for callback in self._gauge_callbacks:
+            for name, help_text, labels, value in callback():
+                if name != last:
+                    header(name, 'gauge', help_text)
+                    last = name
+                lines.append(f'{name}{_format_labels(tuple(sorted(labels.items())))} {_format_number(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def observe_stage(name, seconds):
+    """Record time spent in a processing stage for the current route"""
+    records = _collected.get()
+    if records is not None:
+        records.append(('stage', name, seconds))
+        return
+    registry.observe(
+        'et_stage_seconds', seconds,
+        help_text='Time spent in each processing stage',
+        stage=name, route=current_route.get()
+    )
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as a processing stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def count_questions(count):
+    records = _collected.get()
+    if records is not None:
+        records.append(('questions', None, count))
+        return
+    registry.inc(
+        'et_questions_processed_total', count,
+        help_text='Questions parsed or loaded, per route',
+        route=current_route.get()
+    )
+
+
+def count_bytes(count):
+    records = _collected.get()
+    if records is not None:
+        records.append(('bytes', None, count))
+        return
+    registry.inc(
+        'et_bytes_processed_total', count,
+        help_text='Input bytes read, per route',
+        route=current_route.get()
+    )
+
+
+def collect_call(fn, *args, **kwargs):
+    """Run fn and return (result, metric records) instead of recording them
+
+    Meant for worker processes, whose own registry is never rendered: the
+    parent passes the records to replay() so they count for its route.
+    """
+    records = []
+    token = _collected.set(records)
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        _collected.reset(token)
+    return result, records
+
+
+def replay(records, route=None):
+    """Record metrics returned by collect_call(), under route or the current one"""
+    token = current_route.set(route) if route is not None else None
+    try:
+        for kind, name, value in records:
+            if kind == 'stage':
+                observe_stage(name, value)
+            elif kind == 'questions':
+                count_questions(value)
+            else:
+                count_bytes(value)
+    finally:
+        if token is not None:
+            current_route.reset(token)
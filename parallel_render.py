@@ -0,0 +1,130 @@
+"""Render large question banks in parallel worker processes.
+
+The bank is cut into consecutive question ranges. In split mode each
+range becomes its own part document, written by a worker. In merged mode
+workers render and compress the body XML of their range and the parent
+splices the pieces into one package in range order; its document.xml is
+identical to a serial build_outputs call, and for a given chunk size so
+are the package bytes. Chunks run on a given BuildExecutor, or else on a worker pool
+created on first use and reused by later renders in the same process.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import util
+
+from build_executor import pool_context
+from docx_generator import build_outputs, render_questions_xml
+from docx_writer import DocxWriter, deflate_piece
+from metrics import stage
+
+# Questions per chunk handed to a worker
+DEFAULT_CHUNK_SIZE = 2000
+# Banks smaller than this render serially; forking workers costs more
+DEFAULT_PARALLEL_MIN_QUESTIONS = 20000
+
+# Worker count -> pool, kept for the life of the process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def chunk_ranges(count, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return (start, end) ranges covering count questions in order"""
+    return [(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+
+
+def part_path(target, index):
+    """Name of the index-th (1-based) part document, e.g. bank_part1.docx"""
+    base, extension = os.path.splitext(target)
+    return f'{base}_part{index}{extension or ".docx"}'
+
+
+def _get_pool(workers):
+    with _pools_lock:
+        if not _pools:
+            # A build worker process joins its children before exiting, so
+            # the pools must be stopped first; plain atexit doesn't run there.
+            # This must also run before the finalizers closing pool queues (10)
+            util.Finalize(None, shutdown, exitpriority=20)
+        pool = _pools.get(workers)
+        if pool is None or getattr(pool, '_broken', False):
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+        return pool
+
+
+def shutdown(wait=True):
+    """Stop the worker pools; a later render starts new ones"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
+
+
+def _render_part(kind, questions, target):
+    build_outputs(questions, [(kind, target)])
+    return target
+
+
+def _render_piece(kind, questions):
+    return deflate_piece(render_questions_xml(kind, questions))
+
+
+def render_split(questions, kind, target, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, executor=None):
+    """Write one part document per chunk and return their paths in order
+
+    Parts are named by part_path(target, n). executor and workers are as
+    for render_merged, except that one worker renders in this process.
+    """
+    questions = list(questions)
+    ranges = chunk_ranges(len(questions), chunk_size)
+    if executor is None and (workers or os.cpu_count() or 1) > 1:
+        executor = _get_pool(workers)
+    with stage('docx_build'):
+        return list((executor.map if executor is not None else map)(
+            _render_part,
+            [kind] * len(ranges),
+            [questions[start:end] for start, end in ranges],
+            [part_path(target, index) for index in range(1, len(ranges) + 1)]
+        ))
+
+
+def render_merged(questions, kind, target, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, executor=None):
+    """Write a single document, rendering its chunks in parallel
+
+    target is a path or seekable binary file object, as for build_outputs.
+    With an executor (a BuildExecutor) the chunks are one build on its
+    workers; otherwise they go to this module's pool of workers processes.
+    """
+    questions = list(questions)
+    ranges = chunk_ranges(len(questions), chunk_size)
+    if executor is None:
+        executor = _get_pool(workers)
+    with stage('docx_build'), DocxWriter(target) as writer:
+        # map yields in submission order, holding only pieces not yet written
+        pieces = executor.map(
+            _render_piece,
+            [kind] * len(ranges),
+            [questions[start:end] for start, end in ranges]
+        )
+        for piece in pieces:
+            writer.add_deflated(piece)
+    return True
+
+
+def renders_in_parallel(count, workers=None, min_questions=DEFAULT_PARALLEL_MIN_QUESTIONS):
+    """Whether render_document splits count questions over workers processes"""
+    return (workers or os.cpu_count() or 1) > 1 and count >= min_questions
+
+
+def render_document(questions, kind, target, workers=None, executor=None,
+                    min_questions=DEFAULT_PARALLEL_MIN_QUESTIONS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Render one document, in parallel once the bank is large enough
+
+    With an executor its workers are used and the workers argument ignored.
+    """
+    if executor is not None:
+        workers = max(executor.max_workers, 1)
+    if renders_in_parallel(len(questions), workers, min_questions):
+        return render_merged(questions, kind, target, chunk_size=chunk_size, workers=workers, executor=executor)
+    return build_outputs(questions, [(kind, target)])
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from bank_index import open_compiled_bank
+from metrics import count_bytes, count_questions, stage
+from question_parser import iter_questions
+
+# Maximum number of parsed banks kept in memory at once
+DEFAULT_MAX_BANKS = 8
+
+
+# Read size used when hashing bank files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_fingerprint(path):
+    """Return (size, mtime_ns, sha256) for a question bank file"""
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with stage('read'):
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    count_bytes(stat.st_size)
+    return stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+def parse_question_file(path):
+    """Parse every question of a bank file in a single streaming pass"""
+    with open(path, 'rb') as file:
+        return list(iter_questions(file))
+
+
+class QuestionBankCache:
+    """Process-wide LRU cache of parsed question banks.
+
+    Entries are keyed by absolute path and validated against the file's
+    size, mtime and content hash, so an edited bank is re-parsed on the
+    next lookup. With an index_folder a bank is cached as its CompiledBank,
+    which reads rows only when they are accessed; otherwise as a list.
+    The returned sequences are shared between callers and must be treated
+    as read-only.
+    """
+
+    def __init__(self, max_banks=DEFAULT_MAX_BANKS, index_folder=None):
+        self.max_banks = max_banks
+        # When set, misses load from a compiled index kept in this folder
+        self.index_folder = index_folder
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Return the parsed questions for path, parsing only on a miss"""
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            # Cheap path: size and mtime unchanged since the last lookup
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['questions']
+
+        size, mtime_ns, digest = file_fingerprint(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            # File was touched but its content is the same
+            if entry and entry['sha256'] == digest:
+                entry['size'] = size
+                entry['mtime_ns'] = mtime_ns
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['questions']
+
+        if self.index_folder:
+            # Rows are only read from the index when they are accessed
+            with stage('load_index'):
+                questions = open_compiled_bank(key, self.index_folder, (size, mtime_ns, digest))
+            count_questions(len(questions))
+        else:
+            questions = parse_question_file(key)
+
+        with self._lock:
+            self.misses += 1
+            self._store(key, questions, (size, mtime_ns, digest))
+        return questions
+
+    def put(self, path, questions, fingerprint):
+        """Cache questions already parsed from path, e.g. while it was uploaded
+
+        fingerprint is the (size, mtime_ns, sha256) of the file as written.
+        """
+        with self._lock:
+            self._store(os.path.abspath(path), questions, fingerprint)
+
+    def _store(self, key, questions, fingerprint):
+        # Caller holds the lock
+        size, mtime_ns, digest = fingerprint
+        self._entries[key] = {
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'sha256': digest,
+            'questions': questions,
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_banks:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def fingerprint(self, path):
+        """Return the content hash of a cached bank, loading it if needed"""
+        self.get(path)
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            return entry['sha256'] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'banks': len(self._entries),
+                'max_banks': self.max_banks,
+            }
+
+
+# Shared by every route and document builder in the process
+bank_cache = QuestionBankCache()
+
+
+def load_questions(path):
+    """Return the parsed questions of a bank from the shared cache"""
+    return bank_cache.get(path)
@@ -0,0 +1,201 @@
+import functools
+import logging
+import re
+import time
+
+from metrics import count_questions, observe_stage
+from question_record import QuestionRecord
+
+logger = logging.getLogger(__name__)
+
+# Separators used by the raw question dumps
+QUESTION_SEPARATOR = '###################################################################'
+SECTION_SEPARATOR = '--------------------------------------------------------------'
+
+# Patterns used for every question, compiled once at import time
+QUESTION_NUMBER_RE = re.compile(r'Question #?:?\s*(\d+)')
+TOPIC_NUMBER_RE = re.compile(r'Topic #?:?\s*(\d+)')
+OPTION_LINE_RE = re.compile(r'[A-E]\.\s')
+CORRECT_ANSWER_RE = re.compile(r'CORRECT ANSWER==:\s*([A-D]+)')
+
+# Cleaning passes, compiled once and applied in this order
+URL_RE = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+TIMESTAMP_RE = re.compile(r'\d{1,2}\s*(year|month|week|day)s?(,?\s*\d{1,2}\s*(year|month|week|day)s?)?\s*ago')
+UPVOTED_RE = re.compile(r'upvoted\s*\d+\s*times?', re.IGNORECASE)
+VOTED_RE = re.compile(r'voted\s*\d+\s*times?', re.IGNORECASE)
+# Each alternative runs to the end of the line, so one pass removes all three
+COMMENT_RE = re.compile(r'(?:Selected Answer:|Chosen Answer:|Community).*')
+# A run of whitespace and/or disallowed characters collapses to one space
+SPECIAL_RUN_RE = re.compile(r'[^\w.,():-]+')
+
+# Matches wherever any removal pass above could apply; when it finds
+# nothing the removals are all no-ops and only SPECIAL_RUN_RE is needed
+REMOVAL_RE = re.compile('|'.join([
+    URL_RE.pattern,
+    TIMESTAMP_RE.pattern,
+    r'(?i:voted\s*\d+\s*times?)',
+    COMMENT_RE.pattern,
+]))
+
+# Number of distinct strings remembered by clean_special_characters
+CLEAN_MEMO_SIZE = 65536
+
+def _remove_metadata(text):
+    """Apply the removal passes in their original order"""
+    text = URL_RE.sub('', text)
+    text = TIMESTAMP_RE.sub('', text)
+    text = UPVOTED_RE.sub('', text)
+    text = VOTED_RE.sub('', text)
+    return COMMENT_RE.sub('', text)
+
+@functools.lru_cache(maxsize=CLEAN_MEMO_SIZE)
+def _clean_text(text):
+    if REMOVAL_RE.search(text):
+        text = _remove_metadata(text)
+    return SPECIAL_RUN_RE.sub(' ', text).strip()
+
+def clean_special_characters(text):
+    """Clean up special characters and formatting"""
+    if not text:
+        return text
+    return _clean_text(text)
+
+def clean_texts(texts):
+    """Clean a list of strings in one call"""
+    texts = list(texts)
+    # One scan over the whole batch rules out the removal passes for all items
+    if REMOVAL_RE.search('\n'.join(text for text in texts if text)):
+        return [clean_special_characters(text) for text in texts]
+    return [SPECIAL_RUN_RE.sub(' ', text).strip() if text else text for text in texts]
+
+def parse_question(question_text):
+    """Parse a single question section into a QuestionRecord"""
+    try:
+        # Extract question number
+        number_match = QUESTION_NUMBER_RE.search(question_text)
+        if not number_match:
+            return None
+        question_number = number_match.group(1)
+        
+        # Extract question content
+        content_parts = question_text.split(SECTION_SEPARATOR, 3)
+        if len(content_parts) < 3:
+            return None
+            
+        # Extract topic number from the header, if present
+        topic_match = TOPIC_NUMBER_RE.search(content_parts[0])
+        
+        # Clean up question content - take only the actual question
+        question_content = content_parts[1].strip()
+        
+        # Extract options section
+        options_text = content_parts[2].strip()
+        
+        # Clean up options - take only the actual options before any comments
+        options = []
+        for line in options_text.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            # Only take lines that start with A., B., C., etc.
+            if OPTION_LINE_RE.match(line):
+                # Clean up the option
+                option = clean_special_characters(line)
+                options.append(option)
+        
+        # Extract correct answer
+        correct_match = CORRECT_ANSWER_RE.search(question_text)
+        correct_answers = correct_match.group(1) if correct_match else ''
+        
+        return QuestionRecord(
+            number=question_number,
+            topic=topic_match.group(1) if topic_match else None,
+            content=question_content,
+            options=options,
+            correct=correct_answers
+        )
+        
+    except Exception as e:
+        logger.warning(f"Error parsing question: {str(e)}")
+        return None
+
+def _decode_line(line):
+    """Decode a raw line the way open(..., 'r') would"""
+    return line.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+def iter_question_blocks(source):
+    """Yield raw question blocks from a file object or mmap in one forward pass
+
+    Produces the same blocks as content.split(QUESTION_SEPARATOR) without
+    holding more than the current block in memory. Text files, binary
+    files and mmap objects are all accepted; bytes are decoded as UTF-8.
+    """
+    block = []
+    readline = source.readline
+    line = readline()
+    binary = isinstance(line, bytes)
+    sentinel = b'' if binary else ''
+
+    while line != sentinel:
+        if binary:
+            line = _decode_line(line)
+        if QUESTION_SEPARATOR in line:
+            pieces = line.split(QUESTION_SEPARATOR)
+            block.append(pieces[0])
+            for piece in pieces[1:]:
+                yield ''.join(block)
+                block = [piece]
+        else:
+            block.append(line)
+        line = readline()
+
+    yield ''.join(block)
+
+def iter_questions(source):
+    """Yield parsed questions from a file object or mmap, skipping invalid blocks"""
+    # Stage times are summed locally and reported once per file
+    split_seconds = parse_seconds = 0.0
+    count = 0
+    blocks = iter_question_blocks(source)
+    try:
+        while True:
+            start = time.perf_counter()
+            question_text = next(blocks, None)
+            split_done = time.perf_counter()
+            split_seconds += split_done - start
+            if question_text is None:
+                break
+            if not question_text.strip():
+                continue
+
+            question_data = parse_question(question_text)
+            parse_seconds += time.perf_counter() - split_done
+            if not question_data:
+                continue
+
+            count += 1
+            yield question_data
+    finally:
+        observe_stage('split', split_seconds)
+        observe_stage('parse', parse_seconds)
+        count_questions(count)
+
+def format_cleaned_question(question_data):
+    """Format a cleaned question for output"""
+    lines = [
+        f"Question #: {question_data['number']}",
+        SECTION_SEPARATOR,
+        question_data['content'].strip(),
+        SECTION_SEPARATOR
+    ]
+    
+    # Add options
+    for option in question_data['options']:
+        lines.append(option.strip())
+    
+    # Add correct answer
+    if question_data['correct']:
+        lines.append(SECTION_SEPARATOR)
+        lines.append(f"CORRECT ANSWER==: {''.join(question_data['correct'])}")
+    
+    return '\n'.join(lines)
@@ -0,0 +1,127 @@
+import sys
+from collections.abc import Mapping
+
+# Answer letters are single characters 'A', 'B', ...; bit 0 of a mask is 'A'
+MAX_ANSWER_LETTERS = 5
+
+_LETTERS = tuple(sys.intern(chr(ord('A') + bit)) for bit in range(MAX_ANSWER_LETTERS))
+
+
+def _letters_for(mask):
+    return tuple(_LETTERS[bit] for bit in range(MAX_ANSWER_LETTERS) if mask >> bit & 1)
+
+
+# Shared answer tuples, one per possible mask, so records never hold their own
+_CORRECT_BY_MASK = tuple(_letters_for(mask) for mask in range(1 << MAX_ANSWER_LETTERS))
+_INDICES_BY_MASK = tuple(
+    tuple(bit for bit in range(MAX_ANSWER_LETTERS) if mask >> bit & 1)
+    for mask in range(1 << MAX_ANSWER_LETTERS)
+)
+
+
+def correct_to_mask(correct):
+    """Encode answer letters as a bitmask, bit 0 being 'A'"""
+    mask = 0
+    for letter in correct:
+        mask |= 1 << (ord(letter) - ord('A'))
+    return mask
+
+
+def mask_to_correct(mask):
+    """Decode a bitmask back into the sorted answer letters"""
+    if mask < len(_CORRECT_BY_MASK):
+        return _CORRECT_BY_MASK[mask]
+    return tuple(chr(ord('A') + bit) for bit in range(mask.bit_length()) if mask >> bit & 1)
+
+
+class QuestionRecord(Mapping):
+    """A parsed question in as few objects as possible.
+
+    Fields are slots instead of a per-question dict, options are a tuple,
+    topics are interned and the correct answers are a bitmask decoded into
+    shared tuples of interned letters. Answers that a mask can't represent
+    (out of order or repeated letters) are kept as a tuple instead.
+
+    Records are treated as read-only and still behave as the mapping
+    parse_question used to return, so record['correct'] and dict(record)
+    keep working.
+    """
+
+    __slots__ = ('number', 'topic', 'content', 'options', '_correct')
+
+    FIELDS = ('number', 'topic', 'content', 'options', 'correct')
+
+    def __init__(self, number, topic, content, options, correct):
+        self.number = number
+        self.topic = sys.intern(topic) if topic is not None else None
+        self.content = content
+        self.options = tuple(options)
+        if not isinstance(correct, int):
+            correct = tuple(correct)
+            mask = correct_to_mask(correct)
+            if mask_to_correct(mask) == correct:
+                correct = mask
+        self._correct = correct
+
+    @classmethod
+    def from_mapping(cls, question_data):
+        return cls(
+            question_data['number'], question_data['topic'], question_data['content'],
+            question_data['options'], question_data['correct']
+        )
+
+    @property
+    def correct(self):
+        if isinstance(self._correct, int):
+            return mask_to_correct(self._correct)
+        return self._correct
+
+    @property
+    def correct_mask(self):
+        if isinstance(self._correct, int):
+            return self._correct
+        return correct_to_mask(self._correct)
+
+    @property
+    def correct_indices(self):
+        """Zero-based option indices of the correct answers, in answer order"""
+        if isinstance(self._correct, int) and self._correct < len(_INDICES_BY_MASK):
+            return _INDICES_BY_MASK[self._correct]
+        return tuple(ord(letter) - ord('A') for letter in self.correct)
+
+    def replace(self, **fields):
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        if 'correct' not in fields:
+            values['correct'] = self._correct
+        values.update(fields)
+        return QuestionRecord(**values)
+
+    def to_dict(self):
+        """Plain JSON-serialisable form, as parse_question used to return"""
+        return {
+            'number': self.number,
+            'topic': self.topic,
+            'content': self.content,
+            'options': list(self.options),
+            'correct': list(self.correct),
+        }
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __reduce__(self):
+        return QuestionRecord, (self.number, self.topic, self.content, self.options, self._correct)
+
+    def __repr__(self):
+        return (
+            f'QuestionRecord(number={self.number!r}, topic={self.topic!r}, '
+            f'options={len(self.options)}, correct={"".join(self.correct)!r})'
+        )
@@ -0,0 +1,90 @@
+import csv
+import io
+import json
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv'
+JSONL_MIMETYPE = 'application/x-ndjson'
+
+# Same look as the pandas to_excel header row
+_THIN = Side(style='thin')
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+
+def _cell_value(value):
+    """Values openpyxl can't store natively are written as text"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value)
+
+
+def scan_columns(rows):
+    """Return the column names in first-seen order and each column's width
+
+    Widths are the longest text in the column, header included, plus two.
+    """
+    widths = {}
+    for row in rows:
+        for column, value in row.items():
+            length = len(str(value)) if value is not None else 0
+            if column not in widths:
+                widths[column] = len(str(column))
+            if length > widths[column]:
+                widths[column] = length
+    return list(widths), {column: width + 2 for column, width in widths.items()}
+
+
+def write_xlsx(rows, sheet_name='Sheet1'):
+    """Write rows (a list of dicts) to an in-memory workbook and return its bytes"""
+    # Write-only sheets emit column widths before the first row, so they
+    # are collected together with the column names in a single scan
+    columns, widths = scan_columns(rows)
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_name)
+    for index, column in enumerate(columns, start=1):
+        worksheet.column_dimensions[get_column_letter(index)].width = widths[column]
+
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(worksheet, value=str(column))
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+        header.append(cell)
+    worksheet.append(header)
+
+    for row in rows:
+        worksheet.append([_cell_value(row.get(column)) for column in columns])
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def iter_csv(rows):
+    """Yield CSV text for rows, one line at a time"""
+    columns, _ = scan_columns(rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    for row in rows:
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([_cell_value(row.get(column)) for column in columns])
+    yield buffer.getvalue()
+
+
+def iter_jsonl(rows):
+    """Yield one JSON document per row"""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
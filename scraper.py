@@ -0,0 +1,258 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from question_parser import QUESTION_SEPARATOR, SECTION_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+# Concurrent page fetches and pooled connections per host
+DEFAULT_WORKERS = 8
+# Minimum delay between two requests to the same host, in seconds
+DEFAULT_HOST_INTERVAL = 0.5
+# Cached pages younger than this are reused without asking the server
+DEFAULT_FRESH_FOR = 60 * 60
+REQUEST_TIMEOUT = 30
+USER_AGENT = 'Mozilla/5.0 (compatible; et-scraper/1.0)'
+
+DISCUSSION_LINK_RE = re.compile(r'question-\d+-discussion')
+QUESTION_NUMBER_RE = re.compile(r'Question\s*#?:?\s*(\d+)')
+TOPIC_NUMBER_RE = re.compile(r'Topic\s*#?:?\s*(\d+)')
+OPTION_RE = re.compile(r'^\s*([A-F])\.\s*(.*)$', re.DOTALL)
+
+
+class HostRateLimiter:
+    """Spaces out requests to each host by at least min_interval seconds"""
+
+    def __init__(self, min_interval=DEFAULT_HOST_INTERVAL):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ResponseCache:
+    """On-disk cache of fetched pages with their validators.
+
+    Every page is written as soon as it arrives, so an interrupted run
+    resumes from what it already has.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.folder, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url):
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url, body, etag=None, last_modified=None):
+        entry = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched': time.time(),
+            'body': body,
+        }
+        path = self._path(url)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(entry, file)
+        os.replace(temp_path, path)
+        return entry
+
+
+def _text(element):
+    return ' '.join(element.get_text(' ', strip=True).split()) if element else ''
+
+
+def parse_discussion_page(html, url):
+    """Extract one question from a discussion page, or None if there isn't one"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    header = _text(soup.select_one('.question-discussion-header')) or _text(soup.title)
+    number_match = QUESTION_NUMBER_RE.search(header) or QUESTION_NUMBER_RE.search(soup.get_text(' '))
+    if not number_match:
+        return None
+    topic_match = TOPIC_NUMBER_RE.search(header)
+
+    body = soup.select_one('.question-body') or soup
+    content = _text(body.select_one('.card-text'))
+
+    options = []
+    for item in body.select('li.multi-choice-item'):
+        most_voted = item.select_one('.most-voted-answer-badge')
+        if most_voted:
+            most_voted.extract()
+        match = OPTION_RE.match(_text(item))
+        if not match:
+            continue
+        option = f'{match.group(1)}. {match.group(2)}'
+        if most_voted:
+            option += ' ***Most Voted***'
+        options.append(option)
+
+    correct = _text(body.select_one('.correct-answer'))
+    correct = ''.join(re.findall(r'[A-F]', correct))
+
+    if not content or not options:
+        return None
+
+    return {
+        'number': number_match.group(1),
+        'topic': topic_match.group(1) if topic_match else None,
+        'link': url,
+        'content': content,
+        'options': options,
+        'correct': correct,
+    }
+
+
+def format_scraped_question(question):
+    """Render a scraped question in the raw dump format parse_question reads"""
+    lines = [f"Question #: {question['number']}"]
+    if question['topic']:
+        lines.append(f"Topic #: {question['topic']}")
+    lines.append(f"Question link: {question['link']}")
+    lines.append(SECTION_SEPARATOR)
+    lines.append(question['content'])
+    lines.append(SECTION_SEPARATOR)
+    lines.extend(question['options'])
+    lines.append(SECTION_SEPARATOR)
+    lines.append(f"CORRECT ANSWER==: {question['correct']}")
+    lines.append(QUESTION_SEPARATOR)
+    return '\n'.join(lines)
+
+
+class Scraper:
+    """Fetches discussion pages concurrently through a pooled session.
+
+    Requests are limited per host, revalidated with ETag/Last-Modified
+    when a cached copy exists, and skipped entirely while the cached copy
+    is fresher than fresh_for seconds.
+    """
+
+    def __init__(self, cache_folder, workers=DEFAULT_WORKERS,
+                 host_interval=DEFAULT_HOST_INTERVAL, fresh_for=DEFAULT_FRESH_FOR):
+        self.workers = workers
+        self.fresh_for = fresh_for
+        self.cache = ResponseCache(cache_folder)
+        self.limiter = HostRateLimiter(host_interval)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = USER_AGENT
+        self.stats = {'fetched': 0, 'not_modified': 0, 'cached': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def fetch(self, url):
+        """Return the page body for url, using the cache where possible"""
+        cached = self.cache.get(url)
+        if cached and time.time() - cached['fetched'] < self.fresh_for:
+            self._count('cached')
+            return cached['body']
+
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        self.limiter.wait(url)
+        response = self.session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+        if response.status_code == 304 and cached:
+            self._count('not_modified')
+            entry = self.cache.put(url, cached['body'], cached.get('etag'), cached.get('last_modified'))
+            return entry['body']
+
+        response.raise_for_status()
+        self._count('fetched')
+        self.cache.put(url, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.text
+
+    def discussion_links(self, url, html):
+        """Discussion page links on the same host as url, in page order"""
+        soup = BeautifulSoup(html, 'html.parser')
+        host = urlparse(url).netloc
+        links = []
+        for anchor in soup.find_all('a', href=True):
+            link = urljoin(url, anchor['href']).split('#')[0]
+            if urlparse(link).netloc != host:
+                continue
+            if DISCUSSION_LINK_RE.search(link) and link not in links:
+                links.append(link)
+        return links
+
+    def _scrape_page(self, url):
+        try:
+            return parse_discussion_page(self.fetch(url), url)
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Error scraping {url}: {str(e)}")
+            return None
+
+    def scrape(self, url):
+        """Scrape a discussion page, or every discussion page linked from url"""
+        html = self.fetch(url)
+        questions = []
+
+        question = parse_discussion_page(html, url)
+        if question:
+            questions.append(question)
+
+        links = [link for link in self.discussion_links(url, html) if link != url]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            questions.extend(q for q in executor.map(self._scrape_page, links) if q)
+
+        questions.sort(key=lambda q: (int(q['topic'] or 0), int(q['number'])))
+        return questions
+
+    def scrape_to_file(self, url, output_file):
+        """Scrape url and write the questions in dump format; returns the count"""
+        questions = self.scrape(url)
+        # Concurrent runs each write their own temporary file
+        temp_path = f'{output_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                for question in questions:
+                    file.write(format_scraped_question(question))
+                    file.write('\n\n')
+            os.replace(temp_path, output_file)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return len(questions)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,181 @@
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import defaultdict
+
+from question_bank import bank_cache
+
+TOKEN_RE = re.compile(r'\w+')
+# Quoted phrases and bare words of a search query
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class BankSegment:
+    """Inverted index over the questions of a single bank.
+
+    postings maps term -> {question index: [token positions]}, positions
+    running across the question content followed by its options. Topics
+    are kept per question as codes into topic_codes, so filtering on them
+    doesn't read the questions themselves.
+    """
+
+    def __init__(self, path, fingerprint, questions):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.questions = questions
+        self.lengths = []
+        self.postings = defaultdict(dict)
+        self.topic_codes = {}
+        self.topic_ids = array('I')
+
+        for doc_id, question_data in enumerate(questions):
+            topic = question_data['topic']
+            code = self.topic_codes.get(topic)
+            if code is None:
+                code = self.topic_codes[topic] = len(self.topic_codes)
+            self.topic_ids.append(code)
+
+            position = 0
+            for text in [question_data['content']] + list(question_data['options']):
+                for token in tokenize(text):
+                    self.postings[token].setdefault(doc_id, []).append(position)
+                    position += 1
+                # Keep phrases from matching across option boundaries
+                position += 1
+            self.lengths.append(position)
+
+        self.postings = dict(self.postings)
+        self.total_length = sum(self.lengths)
+
+
+def _has_phrase(segment, doc_id, terms):
+    """True if the terms appear consecutively in the document"""
+    first = segment.postings[terms[0]][doc_id]
+    rest = [set(segment.postings[term][doc_id]) for term in terms[1:]]
+    return any(
+        all(start + offset + 1 in positions for offset, positions in enumerate(rest))
+        for start in first
+    )
+
+
+class SearchIndex:
+    """Full-text index over several banks, refreshed one bank at a time.
+
+    Each bank gets its own BankSegment, rebuilt only when that bank's
+    content hash changes. Ranking uses BM25 with document frequencies
+    summed over all segments.
+    """
+
+    def __init__(self):
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def refresh(self, paths):
+        """Bring the index in line with the given bank files"""
+        with self._lock:
+            for path in list(self._segments):
+                if path not in paths:
+                    del self._segments[path]
+
+            for path in paths:
+                fingerprint = bank_cache.fingerprint(path)
+                segment = self._segments.get(path)
+                if segment is None or segment.fingerprint != fingerprint:
+                    self._segments[path] = BankSegment(path, fingerprint, bank_cache.get(path))
+
+    def search(self, query, topics=None, limit=20, offset=0):
+        """Return (total, results) for a query; results are ranked best first
+
+        Every bare word and every quoted phrase must match. Results are
+        dicts of bank path, question index, score and the question itself;
+        questions are only read for the page returned.
+        """
+        phrases = []
+        words = []
+        for phrase, word in QUERY_RE.findall(query):
+            terms = tokenize(phrase or word)
+            if phrase and len(terms) > 1:
+                phrases.append(terms)
+            words.extend(terms)
+
+        if not words:
+            return 0, []
+
+        with self._lock:
+            segments = list(self._segments.values())
+
+        doc_count = sum(len(segment.lengths) for segment in segments)
+        total_length = sum(segment.total_length for segment in segments)
+        average_length = total_length / doc_count if doc_count else 0
+        terms = sorted(set(words))
+        document_frequency = {
+            term: sum(len(segment.postings.get(term, ())) for segment in segments)
+            for term in terms
+        }
+        idf = {
+            term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+        matches = []
+        segments_by_path = {}
+        for segment in segments:
+            segments_by_path[segment.path] = segment
+            term_postings = [segment.postings.get(term) for term in terms]
+            if not all(term_postings):
+                continue
+            if topics:
+                topic_codes = {segment.topic_codes[topic] for topic in topics if topic in segment.topic_codes}
+                if not topic_codes:
+                    continue
+                topic_ids = segment.topic_ids
+
+            # Intersect starting from the rarest term
+            term_postings.sort(key=len)
+            candidates = set(term_postings[0])
+            for postings in term_postings[1:]:
+                candidates.intersection_update(postings)
+                if not candidates:
+                    break
+
+            for doc_id in candidates:
+                if topics and topic_ids[doc_id] not in topic_codes:
+                    continue
+                if not all(_has_phrase(segment, doc_id, phrase) for phrase in phrases):
+                    continue
+
+                length_norm = 1 - BM25_B + BM25_B * segment.lengths[doc_id] / average_length
+                score = 0.0
+                for term in terms:
+                    frequency = len(segment.postings[term][doc_id])
+                    score += idf[term] * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+                matches.append((score, segment.path, doc_id))
+
+        # Only the matches up to the end of the page need ordering
+        ranked = heapq.nsmallest(offset + limit, matches, key=lambda match: (-match[0], match[1], match[2]))
+        results = [
+            {
+                'bank': path, 'index': doc_id, 'score': round(score, 4),
+                'question': segments_by_path[path].questions[doc_id]
+            }
+            for score, path, doc_id in ranked[offset:]
+        ]
+        return len(matches), results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'banks': len(self._segments),
+                'questions': sum(len(segment.lengths) for segment in self._segments.values()),
+                'terms': sum(len(segment.postings) for segment in self._segments.values()),
+            }
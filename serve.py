@@ -0,0 +1,53 @@
+"""Production entry point.
+
+Serves the app on a threaded WSGI server without the debugger or the
+reloader. Each request gets its own thread; document and spreadsheet
+builds are handed to the bounded build executor (see BUILD_WORKERS and
+BUILD_QUEUE in app.py), so quiz and search requests stay fast while
+documents are generated, and builds beyond the queue limit get 503.
+
+    python serve.py --host 0.0.0.0 --port 8000
+
+Any WSGI server can host app:app instead, e.g. for several processes:
+
+    gunicorn --workers 2 --threads 8 --bind 0.0.0.0:8000 app:app
+
+Every process then has its own caches and build executor.
+"""
+import argparse
+import logging
+import os
+
+from werkzeug.serving import make_server
+
+import app as application
+import parallel_render
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '8000')))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if application.WATCH_INPUTS:
+        application.InputWatcher(
+            application.INPUT_FOLDER, application._process_inputs, interval=application.WATCH_INTERVAL
+        ).start()
+
+    server = make_server(args.host, args.port, application.app, threaded=True)
+    logging.getLogger(__name__).info(f'Serving on http://{args.host}:{server.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        application.build_executor.shutdown()
+        application.job_manager.shutdown()
+        parallel_render.shutdown()
+
+
+if __name__ == '__main__':
+    main()
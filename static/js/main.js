@@ -11,7 +11,15 @@ document.getElementById('scrapeForm').addEventListener('submit', async (e) => {
             body: `url=${encodeURIComponent(url)}`
         });
         const data = await response.json();
-        alert(data.message);
+        if (!data.job_id) {
+            alert(data.message);
+            return;
+        }
+        const job = await waitForJob(data.job_id);
+        const result = job.files[0];
+        alert(job.status === 'done' ?
+            `Scraped ${result.questions} questions into ${result.output}` :
+            `Scraping failed: ${result.error}`);
     } catch (error) {
         alert('Error scraping content');
     }
@@ -23,12 +31,34 @@ document.getElementById('cleanBtn').addEventListener('click', async () => {
             method: 'POST'
         });
         const data = await response.json();
-        alert(data.message);
+        if (!data.job_id) {
+            alert(data.message);
+            return;
+        }
+        const job = await waitForJob(data.job_id);
+        alert(job.status === 'done' ?
+            'Files processed successfully' :
+            `Processing finished with ${job.failed} failed file(s)`);
     } catch (error) {
         alert('Error processing files');
     }
 });
 
+// Poll a background job until it has finished
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.message || 'Failed to read job status');
+        }
+        if (job.status === 'done' || job.status === 'error') {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 function downloadDoc(type) {
     window.location.href = `/download/${type}`;
 }
@@ -45,6 +75,28 @@ let score = 0;
 let quizResults = [];
 let currentQuestionStartTime;
 let wrongAnswers = [];
+// Answers not yet sent to /attempts; sent in batches
+let pendingAttempts = [];
+const ATTEMPT_BATCH_SIZE = 10;
+
+function flushAttempts() {
+    if (pendingAttempts.length === 0) return;
+    const attempts = pendingAttempts;
+    pendingAttempts = [];
+    // keepalive lets the last batch go out while the page unloads
+    fetch('/attempts', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ attempts: attempts }),
+        keepalive: true
+    }).catch(error => console.error('Error recording attempts:', error));
+}
+
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushAttempts();
+});
 
 async function startQuiz() {
     try {
@@ -134,6 +186,14 @@ function checkAnswer() {
         arraysEqual(selectedIndices.sort(), question.correctAnswers.sort()) :
         selectedIndices[0] === question.correctAnswers[0];
     
+    // The server grades the attempt itself
+    pendingAttempts.push({
+        id: question.id,
+        selected: selectedIndices,
+        seconds: (new Date() - currentQuestionStartTime) / 1000
+    });
+    if (pendingAttempts.length >= ATTEMPT_BATCH_SIZE) flushAttempts();
+    
     if (!isCorrect) {
         // Record wrong answer with cleaned options
         wrongAnswers.push({
@@ -202,6 +262,7 @@ function nextQuestion() {
         currentQuestionStartTime = new Date();
         displayQuestion();
     } else {
+        flushAttempts();
         document.getElementById('exportBtn').style.display = 'block';
     }
 }
@@ -266,30 +327,22 @@ function arraysEqual(a, b) {
 
 async function generateAndDownload(docType) {
     try {
-        // Generate the document
-        const generateResponse = await fetch('/generate_doc', {
+        // Generate the document and receive it in the same response
+        const response = await fetch('/generate_doc', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ type: docType })
+            body: JSON.stringify({ type: docType, download: true })
         });
 
-        if (!generateResponse.ok) {
-            const error = await generateResponse.json();
+        if (!response.ok) {
+            const error = await response.json();
             throw new Error(error.message || 'Failed to generate document');
         }
 
-        // Download the generated document
-        const downloadResponse = await fetch(`/download_doc/${docType}`);
-        
-        if (!downloadResponse.ok) {
-            const error = await downloadResponse.json();
-            throw new Error(error.message || 'Failed to download document');
-        }
-
         // Create a blob from the response and trigger download
-        const blob = await downloadResponse.blob();
+        const blob = await response.blob();
         const url = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
         a.href = url;